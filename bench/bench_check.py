@@ -0,0 +1,234 @@
+"""
+Đo hiệu năng check_locked_files với handle.exe giả lập (bench/fake_handle.py)
+
+Chạy được trên Linux/macOS/Windows: backend handle.exe (HandleExeBackend) được
+trỏ tới một script gọi fake_handle.py, nên toàn bộ đường đi thật (chạy
+subprocess, đọc stream, phân tích, so khớp đường dẫn) đều được đo.
+
+Với mỗi kịch bản và chiến lược truy vấn, script báo cáo:
+    - Độ trễ (p50/p90/p99) của một lần kiểm tra
+    - Thông lượng (dòng/giây, MB/giây) tính theo p50
+    - Bộ nhớ cấp phát đỉnh (tracemalloc, chạy riêng) và RSS đỉnh
+
+Kết quả được so với baseline (bench/baseline.json); nếu chậm hơn hoặc tốn bộ
+nhớ hơn quá ngưỡng cho phép, script in cảnh báo REGRESSION và trả mã lỗi 1.
+Baseline phụ thuộc máy chạy: cập nhật bằng --update-baseline trên máy CI.
+
+Cách dùng:
+    python bench/bench_check.py
+    python bench/bench_check.py --scenario medium --strategy full --repeat 3
+    python bench/bench_check.py --update-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import stat
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fake_handle  # noqa: E402
+from lockfilechecker import core as checker  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_TARGET = "C:\\inetpub\\wwwroot\\site"
+
+# Quy mô các kịch bản (số process, tổng số dòng handle, tỉ lệ file trong thư mục đích)
+SCENARIOS = {
+    'small': {'processes': 1000, 'lines': 100_000, 'fraction': 0.01},
+    'medium': {'processes': 2000, 'lines': 1_000_000, 'fraction': 0.01},
+    'large': {'processes': 5000, 'lines': 5_000_000, 'fraction': 0.005},
+}
+
+# Chỉ số được so với baseline: True nếu giá trị lớn hơn là tốt hơn
+COMPARED_METRICS = {
+    'lines_per_second': True,
+    'p50': False,
+    'peak_alloc': False,
+}
+
+
+def prepare_dataset(name, scenario, cache_dir, seed):
+    """Sinh (hoặc dùng lại) bộ dữ liệu giả lập cho kịch bản"""
+    directory = os.path.join(cache_dir, f"{name}-{seed}")
+    meta = fake_handle.load_meta(directory)
+    expected = dict(scenario, seed=seed, target=DEFAULT_TARGET)
+    if meta and all(meta.get(key if key != 'lines' else 'handle_lines') == value
+                    for key, value in expected.items()):
+        return directory, meta
+
+    print(f"Sinh dữ liệu cho kịch bản {name} ({scenario['lines']} dòng)...")
+    meta = fake_handle.generate(directory, scenario['processes'], scenario['lines'],
+                                DEFAULT_TARGET, scenario['fraction'], seed)
+    return directory, meta
+
+
+def write_launcher(directory):
+    """Tạo script thay thế handle.exe, chuyển tiếp tham số cho fake_handle.py serve"""
+    fake_script = os.path.join(BENCH_DIR, "fake_handle.py")
+    if os.name == "nt":
+        launcher = os.path.join(directory, "handle.cmd")
+        with open(launcher, "w", encoding="utf-8") as f:
+            f.write(f'@"{sys.executable}" "{fake_script}" serve "{directory}" %*\n')
+    else:
+        launcher = os.path.join(directory, "handle.sh")
+        with open(launcher, "w", encoding="utf-8") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_script}" serve "{directory}" "$@"\n')
+        os.chmod(launcher, os.stat(launcher).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return launcher
+
+
+def percentile(values, percent):
+    """Phân vị theo phương pháp nearest-rank"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_once(backend, strategy):
+    """Chạy một lần kiểm tra, trả về (thời gian, CheckStats)"""
+    stats = checker.CheckStats()
+    start = time.perf_counter()
+    checker.check_locked_files(DEFAULT_TARGET, strategy=strategy, stats=stats, backend=backend)
+    return time.perf_counter() - start, stats
+
+
+def bench_case(meta, backend, strategy, repeat):
+    """Đo một kịch bản với một chiến lược truy vấn"""
+    run_once(backend, strategy)  # Làm nóng (cache đĩa, import)
+
+    latencies = []
+    stats = None
+    for _ in range(repeat):
+        elapsed, stats = run_once(backend, strategy)
+        latencies.append(elapsed)
+
+    # Kiểm tra tính đúng đắn: số file tìm được phải khớp dữ liệu đã sinh
+    if stats.matched_files != meta['target_lines']:
+        raise AssertionError(f"Sai kết quả: tìm thấy {stats.matched_files} file, "
+                             f"mong đợi {meta['target_lines']}")
+
+    # Đo bộ nhớ ở lần chạy riêng vì tracemalloc làm chậm đáng kể
+    tracemalloc.start()
+    run_once(backend, strategy)
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = percentile(latencies, 50)
+    return {
+        'repeat': repeat,
+        'lines': stats.lines,
+        'bytes': stats.bytes,
+        'matched_files': stats.matched_files,
+        'p50': p50,
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'min': min(latencies),
+        'max': max(latencies),
+        'lines_per_second': stats.lines / p50,
+        'mb_per_second': stats.bytes / p50 / (1024 * 1024),
+        'peak_alloc': peak_alloc,
+        'peak_rss': stats.peak_rss,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """So kết quả với baseline, trả về danh sách mô tả các chỉ số bị suy giảm"""
+    regressions = []
+    for case, metrics in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(f"{case} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return regressions
+
+
+def print_report(results):
+    header = f"{'Kịch bản':<18}{'p50 (s)':>10}{'p90 (s)':>10}{'p99 (s)':>10}{'dòng/giây':>14}{'MB/giây':>10}{'alloc (MB)':>12}"
+    print(header)
+    print("-" * len(header))
+    for case, metrics in results.items():
+        print(f"{case:<18}{metrics['p50']:>10.3f}{metrics['p90']:>10.3f}{metrics['p99']:>10.3f}"
+              f"{metrics['lines_per_second']:>14.0f}{metrics['mb_per_second']:>10.1f}"
+              f"{metrics['peak_alloc'] / (1024 * 1024):>12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng check_locked_files với handle.exe giả lập")
+    parser.add_argument("--scenario", choices=list(SCENARIOS) + ["all"], default="small")
+    parser.add_argument("--strategy", choices=[checker.QUERY_FULL, checker.QUERY_FILTERED, "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "lockfilechecker-bench"))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Ghi kết quả lần này làm baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Mức suy giảm cho phép (0.25 = 25%%)")
+    parser.add_argument("--output", help="Ghi kết quả chi tiết ra file JSON")
+    args = parser.parse_args(argv)
+
+    # Tắt log chi tiết để không đo thời gian ghi log
+    logging.getLogger().setLevel(logging.WARNING)
+
+    scenario_names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    strategies = [checker.QUERY_FULL, checker.QUERY_FILTERED] if args.strategy == "both" else [args.strategy]
+
+    results = {}
+    for name in scenario_names:
+        directory, meta = prepare_dataset(name, SCENARIOS[name], args.cache_dir, args.seed)
+        backend = checker.HandleExeBackend(write_launcher(directory))
+        for strategy in strategies:
+            print(f"Đo {name}/{strategy}...")
+            results[f"{name}/{strategy}"] = bench_case(meta, backend, strategy, args.repeat)
+
+    print()
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nĐã cập nhật baseline: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nChưa có baseline ({args.baseline}), bỏ qua bước so sánh")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n" + "!" * 60)
+        print(f"REGRESSION: {len(regressions)} chỉ số kém hơn baseline quá {args.tolerance:.0%}")
+        for regression in regressions:
+            print(f"  - {regression}")
+        print("!" * 60)
+        return 1
+
+    print(f"\nKhông có suy giảm so với baseline (ngưỡng {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
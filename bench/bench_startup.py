@@ -0,0 +1,118 @@
+"""
+Đo thời gian khởi động nguội của CLI (python -m lockfilechecker check)
+
+Pipeline deploy gọi CLI hàng trăm lần mỗi lần release, nên thời gian từ lúc
+tạo tiến trình Python tới khi có mã thoát phải thấp. Script chạy CLI trên một
+thư mục rỗng nhiều lần (mỗi lần một tiến trình mới) và báo cáo p50/p90 của
+thời gian chạy, đồng thời kiểm tra CLI không nạp các module nặng chỉ cần cho
+giao diện hoặc đánh giá rủi ro (tkinter, psutil).
+
+Kết quả được so với baseline (bench/baseline.json, khóa "startup/cli") giống
+bench_check.py.
+
+Cách dùng:
+    python bench/bench_startup.py
+    python bench/bench_startup.py --repeat 50 --update-baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_check import DEFAULT_BASELINE, compare, percentile  # noqa: E402
+
+# Module không được nạp khi chạy CLI
+FORBIDDEN_MODULES = ("tkinter", "psutil")
+
+
+def cli_command(target, *extra):
+    return [sys.executable, *extra, "-m", "lockfilechecker", "check", target, "-q"]
+
+
+def imported_modules(target):
+    """Danh sách module được nạp trong một lần chạy CLI (theo -X importtime)"""
+    completed = subprocess.run(cli_command(target, "-X", "importtime"), cwd=ROOT_DIR,
+                               capture_output=True, text=True)
+    modules = []
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.append(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def bench_startup(target, repeat):
+    subprocess.run(cli_command(target), cwd=ROOT_DIR, capture_output=True)  # Làm nóng (cache đĩa, .pyc)
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cli_command(target), cwd=ROOT_DIR, capture_output=True)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'repeat': repeat,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'min': min(latencies),
+        'max': max(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động nguội của CLI")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Ghi kết quả lần này làm baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Mức suy giảm cho phép (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="lockfilechecker-startup-") as target:
+        forbidden = [module for module in imported_modules(target) if module.split(".")[0] in FORBIDDEN_MODULES]
+        results = {'startup/cli': bench_startup(target, args.repeat)}
+
+    metrics = results['startup/cli']
+    print(f"Khởi động CLI ({metrics['repeat']} lần): p50 {metrics['p50'] * 1000:.1f} ms, "
+          f"p90 {metrics['p90'] * 1000:.1f} ms, min {metrics['min'] * 1000:.1f} ms")
+
+    if forbidden:
+        print(f"REGRESSION: CLI nạp module không cần thiết: {', '.join(sorted(set(forbidden)))}")
+        return 1
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Đã cập nhật baseline: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Chưa có baseline ({args.baseline}), bỏ qua bước so sánh")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"REGRESSION: {len(regressions)} chỉ số kém hơn baseline quá {args.tolerance:.0%}")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+
+    print(f"Không có suy giảm so với baseline (ngưỡng {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Giả lập handle.exe (Sysinternals) để đo hiệu năng trên mọi hệ điều hành
+
+handle.exe chỉ chạy trên Windows, nên script này sinh output có cùng định dạng
+ở quy mô tùy chỉnh (số process, số dòng handle, tỉ lệ file nằm trong thư mục
+cần kiểm tra) và phát lại output đó như thể là handle.exe thật.
+
+Cách dùng:
+    # Sinh bộ dữ liệu (full.txt, filtered.txt, meta.json) vào thư mục DIR
+    python bench/fake_handle.py generate DIR --processes 1000 --lines 100000 \\
+        --target "C:\\inetpub\\wwwroot\\site" --fraction 0.01
+
+    # Phát lại như handle.exe: "-a" trả về toàn bộ, tên đoạn đường dẫn trả về kết quả lọc
+    python bench/fake_handle.py serve DIR -a /accepteula
+    python bench/fake_handle.py serve DIR /accepteula "C:\\inetpub\\wwwroot\\site" -nobanner
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+
+BANNER = [
+    "",
+    "Nthandle v5.0 - Handle viewer",
+    "Copyright (C) 1997-2022 Mark Russinovich",
+    "Sysinternals - www.sysinternals.com",
+    "",
+]
+SEPARATOR = "-" * 78
+NO_MATCH = "No matching handles found."
+
+# Tên process và tài khoản thường gặp trên máy chủ IIS
+PROCESS_NAMES = [
+    "svchost.exe", "w3wp.exe", "explorer.exe", "chrome.exe", "sqlservr.exe",
+    "MsMpEng.exe", "dotnet.exe", "conhost.exe", "RuntimeBroker.exe", "lsass.exe",
+    "services.exe", "iisexpress.exe", "devenv.exe", "Code.exe", "node.exe",
+]
+USERS = [
+    "NT AUTHORITY\\SYSTEM", "NT AUTHORITY\\NETWORK SERVICE", "IIS APPPOOL\\DefaultAppPool",
+    "CONTOSO\\deploy", "\\<unable to open process>",
+]
+
+# Loại handle và trọng số xuất hiện (xấp xỉ output "handle -a" trên máy chủ thật)
+HANDLE_TYPES = [
+    ("File", 35), ("Key", 15), ("Event", 15), ("Section", 5), ("Mutant", 5),
+    ("Thread", 5), ("ALPC Port", 3), ("Semaphore", 4), ("Directory", 3),
+    ("Token", 2), ("WaitCompletionPacket", 4), ("IoCompletion", 2), ("TpWorkerFactory", 2),
+]
+FILE_ACCESS = ["(RW-)", "(R--)", "(RWD)", "(---)", "(R-D)"]
+OTHER_FILES = [
+    "C:\\Windows\\System32\\{name}.dll",
+    "C:\\Windows\\Microsoft.NET\\Framework64\\v4.0.30319\\{name}.dll",
+    "C:\\Program Files\\Common Files\\{name}\\{name}.dat",
+    "C:\\ProgramData\\Microsoft\\Windows\\{name}.log",
+    "C:\\Users\\deploy\\AppData\\Local\\Temp\\{name}.tmp",
+    "\\Device\\NamedPipe\\{name}",
+]
+TARGET_FILES = [
+    "bin\\{name}.dll", "bin\\{name}.pdb", "App_Data\\{name}.db", "logs\\{name}.log", "{name}.config",
+]
+# Tên đối tượng theo loại handle (một phần đối tượng không có tên)
+OBJECT_NAMES = {
+    "Key": ["HKLM\\SOFTWARE\\Microsoft\\{name}", "HKLM\\SYSTEM\\ControlSet001\\Services\\{name}"],
+    "Event": ["\\BaseNamedObjects\\{name}", "\\Sessions\\1\\BaseNamedObjects\\{name}", ""],
+    "Mutant": ["\\BaseNamedObjects\\{name}", ""],
+    "Semaphore": ["\\BaseNamedObjects\\{name}", ""],
+    "Section": ["\\BaseNamedObjects\\__ComCatalogCache__{name}", "\\Windows\\Theme{name}", ""],
+    "Directory": ["\\KnownDlls", "\\Sessions\\1\\BaseNamedObjects"],
+    "ALPC Port": ["\\RPC Control\\{name}", ""],
+    "Token": ["NT AUTHORITY\\SYSTEM:{name}"],
+}
+
+
+def generate(directory, processes, lines, target, fraction, seed):
+    """
+    Sinh bộ dữ liệu giả lập vào directory
+
+    Returns:
+        Dict thông tin bộ dữ liệu (cũng được ghi vào meta.json)
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    type_names = [name for name, _ in HANDLE_TYPES]
+    type_weights = [weight for _, weight in HANDLE_TYPES]
+    target_lower = target.lower()
+
+    # Chia tổng số dòng handle cho các process (không đều, như máy thật)
+    weights = [rng.expovariate(1.0) for _ in range(processes)]
+    total_weight = sum(weights)
+    counts = [int(lines * weight / total_weight) for weight in weights]
+    counts[0] += lines - sum(counts)
+
+    total_lines = 0
+    file_lines = 0
+    target_lines = 0
+    full_path = os.path.join(directory, "full.txt")
+    filtered_path = os.path.join(directory, "filtered.txt")
+
+    with open(full_path, "w", encoding="utf-8", newline="\r\n") as full, \
+            open(filtered_path, "w", encoding="utf-8", newline="\r\n") as filtered:
+        full.write("\n".join(BANNER) + "\n")
+        total_lines += len(BANNER)
+
+        for index, count in enumerate(counts):
+            name = rng.choice(PROCESS_NAMES)
+            pid = 4 + index * 4
+            full.write(f"{SEPARATOR}\n{name} pid: {pid} {rng.choice(USERS)}\n")
+            total_lines += 2
+
+            handle_types = rng.choices(type_names, type_weights, k=count)
+            for handle_index, handle_type in enumerate(handle_types):
+                handle = 4 + handle_index * 4
+                object_name = f"obj{rng.randrange(1_000_000):06d}"
+
+                if handle_type == "File":
+                    file_lines += 1
+                    if rng.random() < fraction:
+                        target_lines += 1
+                        path = target + "\\" + rng.choice(TARGET_FILES).format(name=object_name)
+                    else:
+                        path = rng.choice(OTHER_FILES).format(name=object_name)
+                    full.write(f" {handle:4X}: File  {rng.choice(FILE_ACCESS)}   {path}\n")
+
+                    if target_lower in path.lower():
+                        filtered.write(f"{name:<18} pid: {pid:<6} type: {'File':<13} {handle:4X}: {path}\n")
+                else:
+                    object_path = rng.choice(OBJECT_NAMES.get(handle_type, [""])).format(name=object_name)
+                    full.write(f" {handle:4X}: {handle_type:<13} {object_path}\n")
+                total_lines += 1
+
+        if not target_lines:
+            filtered.write(NO_MATCH + "\n")
+
+    meta = {
+        'processes': processes,
+        'handle_lines': lines,
+        'target': target,
+        'fraction': fraction,
+        'seed': seed,
+        'total_lines': total_lines,
+        'file_lines': file_lines,
+        'target_lines': target_lines,
+        'full_bytes': os.path.getsize(full_path),
+    }
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_meta(directory):
+    """Đọc meta.json của bộ dữ liệu, None nếu chưa có"""
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def serve(directory, handle_args):
+    """Ghi ra stdout output tương ứng với tham số handle.exe"""
+    meta = load_meta(directory)
+    if meta is None:
+        sys.stderr.write(f"Không tìm thấy bộ dữ liệu trong {directory}\n")
+        return 1
+
+    out = sys.stdout.buffer
+    if "-a" in handle_args:
+        with open(os.path.join(directory, "full.txt"), "rb") as f:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+        return 0
+
+    names = [arg for arg in handle_args if not arg.startswith(("-", "/"))]
+    fragment = names[-1].lower() if names else ""
+
+    # Đoạn đường dẫn nằm trong thư mục đích: lọc lại từ kết quả đã sinh sẵn
+    if fragment and fragment.startswith(meta['target'].lower()):
+        source = os.path.join(directory, "filtered.txt")
+        header = False
+    else:
+        source = os.path.join(directory, "full.txt")
+        header = True
+
+    matched = False
+    current = None
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if header:
+                # Chuyển dòng dạng "-a" sang dạng kết quả lọc
+                if " pid: " in line and not line.startswith(" "):
+                    name, _, rest = line.partition(" pid: ")
+                    current = (name, int(rest.split(" ", 1)[0]))
+                    continue
+                if current is None or ": File  " not in line:
+                    continue
+                handle, _, rest = line.strip().partition(": ")
+                path = rest.split(")", 1)[1].strip()
+                if fragment not in path.lower():
+                    continue
+                line = f"{current[0]:<18} pid: {current[1]:<6} type: {'File':<13} {handle:>4}: {path}"
+            elif fragment not in line.lower():
+                continue
+            matched = True
+            out.write((line + "\r\n").encode("utf-8"))
+
+    if not matched:
+        out.write((NO_MATCH + "\r\n").encode("utf-8"))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Giả lập handle.exe để đo hiệu năng")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Sinh bộ dữ liệu output giả lập")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("--processes", type=int, default=1000)
+    generate_parser.add_argument("--lines", type=int, default=100_000, help="Tổng số dòng handle")
+    generate_parser.add_argument("--target", default="C:\\inetpub\\wwwroot\\site")
+    generate_parser.add_argument("--fraction", type=float, default=0.01,
+                                 help="Tỉ lệ handle File nằm trong thư mục đích")
+    generate_parser.add_argument("--seed", type=int, default=42)
+
+    serve_parser = subparsers.add_parser("serve", help="Phát lại output như handle.exe")
+    serve_parser.add_argument("directory")
+    serve_parser.add_argument("handle_args", nargs=argparse.REMAINDER)
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        meta = generate(args.directory, args.processes, args.lines, args.target, args.fraction, args.seed)
+        print(json.dumps(meta, indent=2))
+        return 0
+    try:
+        return serve(args.directory, args.handle_args)
+    except BrokenPipeError:
+        # Bên đọc dừng giữa chừng (ví dụ khi hủy kiểm tra), giống handle.exe bị dừng
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,31 @@
 import os
-import subprocess
-import platform
 import threading
+import queue
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
+from tkinter import filedialog, messagebox, scrolledtext, simpledialog, ttk
 from datetime import datetime
-import re
-import psutil
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
+from lockfilechecker.core import (
+    HANDLE_TIMEOUT,
+    INCOMPLETE_LABELS,
+    RISK_BATCH_SIZE,
+    RISK_WORKERS,
+    SNAPSHOT_CACHE,
+    SNAPSHOT_TTL,
+    WATCH_TIMELINE_SIZE,
+    CancellationToken,
+    CheckStats,
+    LockWatcher,
+    RiskAssessor,
+    check_locked_folders,
+    format_timeline_event,
+    kill_process,
+    save_result,
+)
+from lockfilechecker.service import SERVICE_URL, LockServiceClient
+
 # Thiết lập logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -16,313 +33,15 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-# Tự động xác định phiên bản handle.exe phù hợp
-def get_handle_path():
-    logging.debug("Bắt đầu xác định đường dẫn handle.exe")
-
-    handle_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Handle")
-    logging.debug(f"Thư mục Handle: {handle_dir}")
-
-    # Kiểm tra kiến trúc hệ thống
-    machine = platform.machine()
-    logging.debug(f"Kiến trúc hệ thống: {machine}")
-
-    if machine.endswith('64'):
-        # Kiểm tra nếu là ARM64
-        if 'ARM' in machine.upper():
-            handle_exe = "handle64a.exe"
-            logging.debug("Đã chọn handle64a.exe (ARM64)")
-        else:
-            handle_exe = "handle64.exe"
-            logging.debug("Đã chọn handle64.exe (x64)")
-    else:
-        handle_exe = "handle.exe"
-        logging.debug("Đã chọn handle.exe (x86)")
-
-    full_path = os.path.join(handle_dir, handle_exe)
-    logging.debug(f"Đường dẫn đầy đủ: {full_path}")
-
-    if os.path.exists(full_path):
-        logging.debug(f"File {handle_exe} tồn tại")
-    else:
-        logging.warning(f"File {handle_exe} không tồn tại")
-
-    return full_path
-
-HANDLE_EXE = get_handle_path()  # Đường dẫn tới handle.exe phù hợp với hệ thống
-
-# Hàm đánh giá rủi ro khi kill process
-def assess_process_risk(pid, process_name):
-    """
-    Đánh giá rủi ro khi kill một process
-
-    Args:
-        pid: Process ID
-        process_name: Tên process
-
-    Returns:
-        Tuple (mức độ rủi ro, mô tả rủi ro)
-        Mức độ rủi ro: 0 = thấp, 1 = trung bình, 2 = cao
-    """
-    logging.debug(f"Đánh giá rủi ro cho process: {process_name} (PID: {pid})")
-
-    try:
-        # Danh sách các process quan trọng của hệ thống
-        critical_processes = [
-            "system", "winlogon", "services", "lsass", "svchost", "csrss",
-            "smss", "wininit", "explorer", "spoolsv", "taskmgr"
-        ]
-
-        # Danh sách các process thường gặp và ít rủi ro
-        safe_processes = [
-            "chrome", "firefox", "msedge", "iexplore", "notepad", "wordpad",
-            "winword", "excel", "powerpnt", "outlook", "code", "devenv"
-        ]
-
-        # Chuyển process_name về chữ thường để so sánh
-        process_name_lower = process_name.lower()
-        logging.debug(f"Process name (lowercase): {process_name_lower}")
-
-        # Kiểm tra nếu là process hệ thống quan trọng
-        for proc in critical_processes:
-            if proc in process_name_lower:
-                logging.warning(f"Process {process_name} được xác định là tiến trình hệ thống quan trọng (rủi ro cao)")
-                return (2, f"⚠️ RỦI RO CAO: {process_name} là tiến trình hệ thống quan trọng. "
-                           f"Việc kill có thể gây mất ổn định hoặc crash hệ thống.")
-
-        # Kiểm tra nếu là process an toàn
-        for proc in safe_processes:
-            if proc in process_name_lower:
-                logging.debug(f"Process {process_name} được xác định là ứng dụng thông thường (rủi ro thấp)")
-                return (0, f"✅ RỦI RO THẤP: {process_name} là ứng dụng thông thường. "
-                           f"Có thể kill nhưng bạn có thể mất dữ liệu chưa lưu.")
-
-        # Kiểm tra số lượng child process
-        try:
-            process = psutil.Process(pid)
-            children = process.children(recursive=True)
-            logging.debug(f"Process {process_name} có {len(children)} tiến trình con")
-
-            if len(children) > 3:
-                logging.info(f"Process {process_name} có nhiều tiến trình con ({len(children)}) - rủi ro trung bình")
-                return (1, f"⚠️ RỦI RO TRUNG BÌNH: {process_name} có {len(children)} tiến trình con. "
-                           f"Việc kill có thể ảnh hưởng đến các ứng dụng khác.")
-        except Exception as child_error:
-            logging.error(f"Lỗi khi kiểm tra tiến trình con: {str(child_error)}")
-
-        # Mặc định là rủi ro trung bình
-        logging.debug(f"Process {process_name} được đánh giá mặc định là rủi ro trung bình")
-        return (1, f"⚠️ RỦI RO TRUNG BÌNH: {process_name} không phải là tiến trình hệ thống quan trọng "
-                   f"nhưng cũng không phải ứng dụng thông thường. Hãy cẩn thận khi kill.")
-
-    except Exception as e:
-        logging.exception(f"Lỗi khi đánh giá rủi ro cho process {process_name}: {str(e)}")
-        return (1, f"⚠️ RỦI RO KHÔNG XÁC ĐỊNH: Không thể đánh giá rủi ro cho {process_name}. {str(e)}")
-
-# Hàm kill process
-def kill_process(pid):
-    """
-    Kill một process theo PID
-
-    Args:
-        pid: Process ID
-
-    Returns:
-        Tuple (thành công, thông báo)
-    """
-    logging.info(f"Bắt đầu kill process với PID: {pid}")
-
-    try:
-        process = psutil.Process(pid)
-        process_name = process.name()
-        logging.debug(f"Tìm thấy process: {process_name} (PID: {pid})")
-
-        # Kill process
-        process.kill()
-        logging.info(f"Đã kill thành công process {process_name} (PID: {pid})")
-
-        return (True, f"✅ Đã kill thành công process {process_name} (PID: {pid})")
-    except psutil.NoSuchProcess:
-        logging.error(f"Process với PID {pid} không tồn tại")
-        return (False, f"❌ Process với PID {pid} không tồn tại")
-    except psutil.AccessDenied:
-        logging.error(f"Không đủ quyền để kill process (PID: {pid})")
-        return (False, f"❌ Không đủ quyền để kill process (PID: {pid}). Hãy chạy với quyền Administrator")
-    except Exception as e:
-        logging.exception(f"Lỗi khi kill process (PID: {pid}): {str(e)}")
-        return (False, f"❌ Lỗi khi kill process (PID: {pid}): {str(e)}")
-
-def check_locked_files(folder_path, callback=None):
-    """
-    Kiểm tra các file bị khóa trong thư mục
-
-    Args:
-        folder_path: Đường dẫn thư mục cần kiểm tra
-        callback: Hàm callback để cập nhật kết quả (cho chạy bất đồng bộ)
-
-    Returns:
-        Chuỗi kết quả nếu không có callback, hoặc None nếu có callback
-        Nếu có callback, trả về dict chứa thông tin process
-    """
-    logging.debug(f"Bắt đầu kiểm tra file bị khóa trong thư mục: {folder_path}")
-
-    # Kiểm tra handle.exe tồn tại
-    handle_exe = HANDLE_EXE
-    handle_name = os.path.basename(handle_exe)
-    logging.debug(f"Sử dụng handle.exe: {handle_exe}")
-
-    if not os.path.exists(handle_exe):
-        logging.error(f"Không tìm thấy {handle_name}")
-        result = f"❌ Không tìm thấy {handle_name}. Tải từ: https://learn.microsoft.com/en-us/sysinternals/downloads/handle và đặt vào thư mục Handle"
-        if callback:
-            callback(result, None)
-            return
-        return result
-
-    try:
-        # Hiển thị thông báo đang chạy nếu có callback
-        if callback:
-            logging.debug("Gọi callback với thông báo đang kiểm tra")
-            callback("⏳ Đang kiểm tra, vui lòng đợi...", None)
-
-        # Chạy handle.exe với đường dẫn thư mục
-        # Sử dụng tham số -a để hiển thị tất cả các handle
-        logging.debug(f"Chạy lệnh: {handle_exe} -a /accepteula")
-        result = subprocess.run([handle_exe, "-a", "/accepteula"],
-                               capture_output=True, text=True, timeout=60)
-
-        logging.debug(f"Kết quả trả về: exit code={result.returncode}")
-        if result.returncode != 0:
-            logging.error(f"Lỗi khi chạy handle.exe: {result.stderr}")
-
-        logging.debug(f"Kích thước output: {len(result.stdout)} ký tự")
-
-        # Phân tích kết quả
-        lines = result.stdout.splitlines()
-        logging.debug(f"Số dòng output: {len(lines)}")
-
-        locked_files = {}  # Sử dụng dict để nhóm theo process
-        process_info_dict = {}  # Lưu thông tin chi tiết về process
-
-        # Pattern để trích xuất PID từ output của handle.exe
-        pid_pattern = re.compile(r'(\S+)\s+pid:\s+(\d+)\s+(.*)')
-        logging.debug(f"Sử dụng pattern: {pid_pattern.pattern}")
-
-        # Lấy thông tin về các process trước
-        current_process = None
-        current_pid = None
-        current_details = None
-
-        # Thêm debug info vào kết quả
-        result_debug = ["=== DEBUG: Handle.exe Output ==="]
-        result_debug.extend(lines[:100])  # Chỉ lấy 100 dòng đầu để tránh quá dài
-        if len(lines) > 100:
-            result_debug.append(f"... và {len(lines) - 100} dòng khác")
-        result_debug.append("=== END DEBUG ===\n")
-
-        logging.debug(f"Bắt đầu phân tích {len(lines)} dòng output")
-        process_count = 0
-        file_count = 0
-        matched_file_count = 0
-
-        for i, line in enumerate(lines):
-            # Kiểm tra nếu là dòng thông tin process mới
-            pid_match = pid_pattern.match(line)
-            if pid_match:
-                process_count += 1
-                current_process = pid_match.group(1)
-                current_pid = int(pid_match.group(2))
-                current_details = pid_match.group(3)
-                logging.debug(f"Tìm thấy process: {current_process} (PID: {current_pid})")
-                continue
+FOLDER_SEPARATOR = ";"  # Ký tự phân cách khi nhập nhiều thư mục trên giao diện
+RISK_PENDING_TEXT = "⏳ Đang đánh giá"
 
-            # Kiểm tra nếu là dòng thông tin file
-            if ":" in line and current_process:
-                file_count += 1
-                parts = line.split(":", 1)  # Chỉ tách thành 2 phần
-                if len(parts) >= 2:
-                    file_path = parts[1].strip()
-
-                    # Kiểm tra xem file có thuộc thư mục cần kiểm tra không
-                    try:
-                        norm_file = os.path.normpath(file_path).lower()
-                        norm_folder = os.path.normpath(folder_path).lower()
-
-                        logging.debug(f"So sánh: {norm_file} với {norm_folder}")
-
-                        # Nếu file thuộc thư mục cần kiểm tra hoặc là thư mục con
-                        if norm_file.startswith(norm_folder):
-                            matched_file_count += 1
-                            logging.debug(f"Tìm thấy file bị chiếm dụng: {file_path} bởi {current_process}")
-
-                            # Lưu thông tin process
-                            process_key = f"{current_process} (PID: {current_pid})"
-                            if process_key not in process_info_dict:
-                                process_info_dict[process_key] = {
-                                    'name': current_process,
-                                    'pid': current_pid,
-                                    'details': current_details,
-                                    'files': []
-                                }
-
-                            process_info_dict[process_key]['files'].append(file_path)
-
-                            # Nhóm theo process
-                            if process_key not in locked_files:
-                                locked_files[process_key] = []
-                            locked_files[process_key].append(file_path)
-                    except Exception as e:
-                        logging.error(f"Lỗi khi xử lý đường dẫn: {e}")
-
-        logging.debug(f"Kết quả phân tích: {process_count} processes, {file_count} files, {matched_file_count} files bị chiếm dụng")
-        logging.debug(f"Số lượng processes chiếm dụng file: {len(locked_files)}")
-
-        # Tạo kết quả
-        logging.debug("Bắt đầu tạo kết quả")
-
-        if locked_files:
-            logging.info(f"Tìm thấy {len(locked_files)} tiến trình đang chiếm dụng file")
-            output = [f"🔒 Các file đang bị chiếm dụng ({len(locked_files)} tiến trình):\n"]
-
-            for process, files in locked_files.items():
-                logging.debug(f"Process {process}: {len(files)} files")
-                output.append(f"\n📌 Process: {process}")
-                for file in files:
-                    output.append(f"  - {file}")
-
-            # Thêm thông tin debug
-            output.append("\n\n" + "\n".join(result_debug))
-
-            result_text = "\n".join(output)
-        else:
-            logging.info("Không tìm thấy file nào bị chiếm dụng")
-            # Thêm thông tin debug vào kết quả trống
-            debug_text = "\n\n" + "\n".join(result_debug)
-            result_text = f"✅ Không có file nào bị chiếm dụng trong thư mục này.\n\nThư mục kiểm tra: {folder_path}{debug_text}"
-            process_info_dict = None
-
-        # Trả về kết quả
-        logging.debug("Hoàn thành kiểm tra, trả về kết quả")
-        if callback:
-            logging.debug("Gọi callback với kết quả")
-            callback(result_text, process_info_dict)
-            return
-        return result_text
+# Bảng tiến trình chỉ tạo dòng theo từng trang để giữ giao diện nhanh với rất nhiều file
+PROCESS_PAGE_SIZE = 500  # Số tiến trình hiển thị mỗi lần
+FILE_PAGE_SIZE = 200  # Số file hiển thị mỗi lần khi mở rộng một tiến trình
 
-    except subprocess.TimeoutExpired:
-        logging.error("Quá thời gian chờ khi chạy handle.exe")
-        result = "⚠️ Quá thời gian chờ khi chạy handle.exe. Thư mục có thể quá lớn hoặc có vấn đề truy cập."
-        if callback:
-            callback(result, None)
-            return
-        return result
-    except Exception as e:
-        logging.exception(f"Lỗi không xác định khi kiểm tra file bị khóa: {str(e)}")
-        result = f"❌ Lỗi: {str(e)}"
-        if callback:
-            callback(result, None)
-            return
-        return result
+UI_FRAME_MS = 33  # Chu kỳ (ms) luồng giao diện áp dụng các cập nhật từ luồng nền (~30 khung hình/giây)
+UI_MAX_EVENTS_PER_FRAME = 5000  # Số cập nhật tối đa lấy ra trong một khung hình, phần còn lại để khung sau
 
 # ------------------- GUI -------------------
 class LockedFileCheckerApp:
@@ -337,7 +56,29 @@ class LockedFileCheckerApp:
         self.status_var = tk.StringVar(value="Sẵn sàng")
         self.is_checking = False
         self.check_thread = None
-        self.process_info = None  # Lưu thông tin về các process đang chiếm dụng file
+        self.result = None  # LockResult của lần kiểm tra gần nhất (None khi đang kiểm tra hoặc đã xóa)
+        self.streamed_items = {}  # pid -> item_id của các dòng hiển thị trong lúc kiểm tra
+        self.process_order = []  # Các LockRecord theo thứ tự hiển thị (để phân trang)
+        self.process_loaded = 0  # Số process trong process_order đã được tạo dòng trên bảng
+        self.more_processes_item = None  # Dòng "tải thêm tiến trình" (nếu còn trang chưa hiển thị)
+        self.lazy_parents = {}  # item_id của process chưa mở rộng -> (LockRecord, item_id dòng giữ chỗ)
+        self.tree_loaders = {}  # item_id của dòng "tải thêm" -> hàm tải trang tiếp theo
+        self.stats = None  # CheckStats của lần kiểm tra gần nhất
+        self.risk_assessor = RiskAssessor()  # Đánh giá rủi ro có ghi nhớ, dùng chung cho bảng, chi tiết, kill và lưu kết quả
+        self.risk_executor = ThreadPoolExecutor(max_workers=RISK_WORKERS, thread_name_prefix="risk")
+        self.ui_queue = queue.SimpleQueue()  # Cập nhật từ luồng nền chờ luồng giao diện áp dụng (xem post_ui)
+        self.risk_generation = 0  # Tăng mỗi lần hiển thị bảng mới để bỏ kết quả của lần trước
+        self.risk_pending = 0  # Số process chưa có kết quả rủi ro
+        self.detailed_stats_var = tk.BooleanVar(value=False)  # Đo chi tiết từng giai đoạn phân tích
+        self.cancel_token = None  # CancellationToken của lần kiểm tra đang chạy
+        self.timeout_var = tk.IntVar(value=HANDLE_TIMEOUT)  # Thời gian chờ tối đa (giây) cho mỗi lần kiểm tra
+        self.partial_results_var = tk.BooleanVar(value=True)  # Giữ kết quả một phần khi hủy/quá thời gian chờ
+        self.snapshot_cache_var = tk.BooleanVar(value=True)  # Dùng lại ảnh chụp gần nhất (SNAPSHOT_TTL giây) cho các lần kiểm tra liên tiếp
+        self.snapshot_stale = False  # True sau khi kill process: lần kiểm tra tiếp theo chụp lại
+        self.service_client = None  # LockServiceClient khi kiểm tra qua dịch vụ (python -m lockfilechecker serve)
+        self.diagnostics_visible = False
+        self.watcher = None  # LockWatcher khi đang ở chế độ theo dõi
+        self.timeline_visible = False
 
         # Tạo giao diện
         self.create_widgets()
@@ -348,13 +89,16 @@ class LockedFileCheckerApp:
         # Thiết lập xử lý khi đóng cửa sổ
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        # Áp dụng định kỳ các cập nhật từ luồng nền
+        self.root.after(UI_FRAME_MS, self.drain_ui_queue)
+
     def create_widgets(self):
         # Frame chính
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
 
-        # Frame chọn thư mục
-        folder_frame = ttk.LabelFrame(main_frame, text="Thư mục cần kiểm tra", padding="5")
+        # Frame chọn thư mục (có thể nhập nhiều thư mục, phân cách bằng FOLDER_SEPARATOR)
+        folder_frame = ttk.LabelFrame(main_frame, text=f"Thư mục cần kiểm tra (nhiều thư mục cách nhau bởi '{FOLDER_SEPARATOR}')", padding="5")
         folder_frame.pack(fill=tk.X, pady=5)
 
         folder_entry = ttk.Entry(folder_frame, textvariable=self.folder_var, width=70)
@@ -363,6 +107,9 @@ class LockedFileCheckerApp:
         browse_btn = ttk.Button(folder_frame, text="Chọn...", command=self.browse_folder)
         browse_btn.pack(side=tk.LEFT, padx=5)
 
+        add_folder_btn = ttk.Button(folder_frame, text="➕ Thêm...", command=self.add_folder)
+        add_folder_btn.pack(side=tk.LEFT, padx=5)
+
         # Frame nút điều khiển
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(fill=tk.X, pady=10)
@@ -383,6 +130,13 @@ class LockedFileCheckerApp:
         )
         self.stop_btn.pack(side=tk.LEFT, padx=5)
 
+        self.watch_btn = ttk.Button(
+            control_frame,
+            text="👁 Theo dõi",
+            command=self.toggle_watch
+        )
+        self.watch_btn.pack(side=tk.LEFT, padx=5)
+
         save_btn = ttk.Button(
             control_frame,
             text="💾 Lưu kết quả",
@@ -411,7 +165,11 @@ class LockedFileCheckerApp:
 
         # Tạo bảng tiến trình với Treeview
         columns = ("process", "pid", "files", "risk", "action")
-        self.process_tree = ttk.Treeview(process_frame, columns=columns, show="headings", selectmode="browse")
+        self.process_tree = ttk.Treeview(process_frame, columns=columns, show="tree headings", selectmode="browse")
+
+        # Cột cây chỉ chứa nút mở rộng danh sách file của tiến trình
+        self.process_tree.heading("#0", text="")
+        self.process_tree.column("#0", width=30, stretch=False)
 
         # Định nghĩa các cột
         self.process_tree.heading("process", text="Tiến trình")
@@ -437,6 +195,7 @@ class LockedFileCheckerApp:
 
         # Binding sự kiện chọn process và click vào nút kill
         self.process_tree.bind("<<TreeviewSelect>>", self.on_process_select)
+        self.process_tree.bind("<<TreeviewOpen>>", self.on_process_open)
         self.process_tree.bind("<ButtonRelease-1>", self.kill_selected_process)
 
         # Frame thông tin chi tiết về tiến trình
@@ -453,14 +212,51 @@ class LockedFileCheckerApp:
         self.process_info_text.pack(fill=tk.BOTH, expand=True)
         self.process_info_text.config(state=tk.DISABLED)
 
+        # Khung chẩn đoán hiệu năng (thu gọn được, mặc định ẩn)
+        diagnostics_frame = ttk.Frame(result_container)
+        diagnostics_frame.pack(fill=tk.X, padx=5)
+
+        self.diagnostics_btn = ttk.Button(
+            diagnostics_frame,
+            text="▶ Diagnostics",
+            command=self.toggle_diagnostics
+        )
+        self.diagnostics_btn.pack(anchor="w")
+
+        self.diagnostics_text = scrolledtext.ScrolledText(
+            diagnostics_frame,
+            wrap=tk.NONE,
+            font=("Consolas", 9),
+            height=10
+        )
+        self.diagnostics_text.config(state=tk.DISABLED)
+
+        # Dòng thời gian khóa/mở khóa của chế độ theo dõi (thu gọn được, mặc định ẩn)
+        timeline_frame = ttk.Frame(result_container)
+        timeline_frame.pack(fill=tk.X, padx=5)
+
+        self.timeline_btn = ttk.Button(
+            timeline_frame,
+            text="▶ Timeline",
+            command=self.toggle_timeline
+        )
+        self.timeline_btn.pack(anchor="w")
+
+        self.timeline_text = scrolledtext.ScrolledText(
+            timeline_frame,
+            wrap=tk.NONE,
+            font=("Consolas", 9),
+            height=8
+        )
+        self.timeline_text.config(state=tk.DISABLED)
+
         # Tạo style cho các tag
         self.process_tree.tag_configure('low_risk', background='#e6ffe6')  # Xanh nhạt
         self.process_tree.tag_configure('medium_risk', background='#fff2e6')  # Cam nhạt
         self.process_tree.tag_configure('high_risk', background='#ffe6e6')  # Đỏ nhạt
-
-        # Tạo một text box ẩn để lưu kết quả chi tiết (không hiển thị)
-        self.output_box = scrolledtext.ScrolledText(self.root)
-        self.output_box.pack_forget()
+        self.process_tree.tag_configure('pending_risk', foreground='#808080')  # Chưa đánh giá xong
+        self.process_tree.tag_configure('file', foreground='#404040')  # Dòng file của một tiến trình
+        self.process_tree.tag_configure('more', foreground='#0066cc')  # Dòng "tải thêm"
 
         # Thêm menu
         self.create_menu()
@@ -479,7 +275,16 @@ class LockedFileCheckerApp:
         # Menu Công cụ
         tools_menu = tk.Menu(menubar, tearoff=0)
         tools_menu.add_command(label="🔍 Kiểm tra", command=self.run_check)
+        tools_menu.add_command(label="🔄 Kiểm tra lại (chụp mới)", command=self.refresh_check)
         tools_menu.add_command(label="Xóa kết quả", command=self.clear_results)
+        tools_menu.add_separator()
+        tools_menu.add_checkbutton(label="Đo chi tiết từng giai đoạn", variable=self.detailed_stats_var)
+        tools_menu.add_command(label="Diagnostics", command=self.toggle_diagnostics)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Thời gian chờ...", command=self.set_timeout)
+        tools_menu.add_checkbutton(label="Giữ kết quả một phần khi hủy", variable=self.partial_results_var)
+        tools_menu.add_checkbutton(label=f"Dùng lại ảnh chụp trong {SNAPSHOT_TTL} giây", variable=self.snapshot_cache_var)
+        tools_menu.add_command(label="Kết nối dịch vụ...", command=self.connect_service)
         menubar.add_cascade(label="Công cụ", menu=tools_menu)
 
         # Menu Trợ giúp
@@ -495,20 +300,101 @@ class LockedFileCheckerApp:
         if folder_selected:
             self.folder_var.set(folder_selected)
 
-    def update_output(self, text, process_info=None):
-        logging.debug("Cập nhật kết quả từ thread kiểm tra")
+    def add_folder(self):
+        # Thêm một thư mục vào danh sách để kiểm tra nhiều thư mục trong một lần
+        folder_selected = filedialog.askdirectory()
+        if folder_selected:
+            folders = self.get_folders()
+            if folder_selected not in folders:
+                folders.append(folder_selected)
+            self.folder_var.set(f"{FOLDER_SEPARATOR} ".join(folders))
+
+    def get_folders(self):
+        """Trả về danh sách thư mục đã nhập (bỏ qua phần tử rỗng)"""
+        return [folder.strip() for folder in self.folder_var.get().split(FOLDER_SEPARATOR) if folder.strip()]
+
+    # ------------------- Kênh cập nhật giao diện -------------------
+    # Luồng nền không chạm vào widget Tk: chúng chỉ đẩy (loại, dữ liệu) vào
+    # ui_queue, còn drain_ui_queue chạy trên luồng giao diện mỗi UI_FRAME_MS
+    # và gộp mọi cập nhật trong một khung hình thành một lần vẽ lại.
+
+    def post_ui(self, kind, *payload):
+        """
+        Gửi một cập nhật cho luồng giao diện (an toàn khi gọi từ mọi luồng)
+
+        Args:
+            kind: "progress" (text), "lock" (PID, tên, số file),
+                "result" (LockResult), "watch" (LockResult, LockDiff, sự kiện) hoặc
+                "risk" (generation, kết quả, (wall, cpu))
+        """
+        self.ui_queue.put((kind, payload))
 
-        # Lưu kết quả chi tiết vào output_box ẩn
-        self.output_box.delete(1.0, tk.END)
-        self.output_box.insert(tk.END, text)
+    def drain_ui_queue(self):
+        # Chạy trên luồng giao diện: lấy các cập nhật đang chờ và gộp lại
+        try:
+            progress = None
+            locks = {}  # pid -> (tên, số file): chỉ giữ giá trị mới nhất
+            results = []
+            risk_batches = []
+            for _ in range(UI_MAX_EVENTS_PER_FRAME):
+                try:
+                    kind, payload = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "progress":
+                    progress = payload[0]
+                elif kind == "lock":
+                    locks[payload[0]] = payload[1:]
+                elif kind == "result":
+                    results.append(payload)
+                elif kind == "risk":
+                    risk_batches.append(payload)
+                elif kind == "watch":
+                    results.append(payload)
+
+            if progress:
+                self.status_var.set(progress)
+            if locks:
+                self.show_streamed_locks(locks)
+            for payload in results:
+                if len(payload) == 1:
+                    self.update_output(*payload)
+                else:
+                    self.apply_watch_update(*payload)
+            if risk_batches:
+                self.apply_risk_results(risk_batches)
+        except Exception as e:
+            logging.exception(f"Lỗi khi cập nhật giao diện: {str(e)}")
+        finally:
+            self.root.after(UI_FRAME_MS, self.drain_ui_queue)
+
+    def show_progress(self, text):
+        # Thông báo "đang kiểm tra" từ thread kiểm tra: chỉ cập nhật thanh trạng thái
+        self.post_ui("progress", text)
+
+    def on_check_result(self, result):
+        # Được gọi từ thread kiểm tra khi có kết quả cuối cùng
+        self.post_ui("result", result)
+
+    def update_output(self, result):
+        # Chạy trên luồng giao diện (qua drain_ui_queue)
+        logging.debug("Cập nhật kết quả từ thread kiểm tra")
+        query_info = result.query_info
 
         # Cập nhật trạng thái
-        if process_info and len(process_info) > 0:
-            logging.info(f"Tìm thấy {len(process_info)} tiến trình đang chiếm dụng file")
-            self.status_var.set(f"Tìm thấy {len(process_info)} tiến trình đang chiếm dụng file")
+        if result.error:
+            # Lỗi, hủy hoặc quá thời gian chờ
+            status = result.error
+        elif result.process_count:
+            status = f"Tìm thấy {result.process_count} tiến trình đang chiếm dụng file"
         else:
-            logging.info("Không tìm thấy file bị chiếm dụng")
-            self.status_var.set("Hoàn thành - Không tìm thấy file bị chiếm dụng")
+            status = "Hoàn thành - Không tìm thấy file bị chiếm dụng"
+
+        if query_info:
+            status += f" ({query_info['strategy']}, {query_info['elapsed']:.2f} giây)"
+            if query_info.get('incomplete'):
+                status += f" - {INCOMPLETE_LABELS.get(query_info['incomplete'], query_info['incomplete'])}"
+        self.status_var.set(status)
 
         # Kích hoạt lại nút kiểm tra
         logging.debug("Cập nhật trạng thái giao diện")
@@ -518,15 +404,221 @@ class LockedFileCheckerApp:
 
         # Cập nhật thông tin process
         logging.debug("Cập nhật thông tin process")
-        self.process_info = process_info
+        self.result = result
         self.update_process_list()
+        self.update_diagnostics()
+
+    # ------------------- Chế độ theo dõi -------------------
+    def toggle_watch(self):
+        if self.watcher:
+            self.stop_watch()
+            return
+
+        folders = self.get_folders()
+        invalid_folders = [folder for folder in folders if not os.path.exists(folder)]
+        if not folders or invalid_folders:
+            messagebox.showerror("Lỗi", "Vui lòng chọn thư mục hợp lệ.\n\n" + "\n".join(invalid_folders))
+            return
+
+        logging.info(f"Bắt đầu chế độ theo dõi: {folders}")
+        self.risk_generation += 1
+        self.risk_pending = 0
+        self.clear_process_tree()
+        self.result = None
+        self.stats = None
+
+        watcher = LockWatcher(
+            folders,
+            lambda *args: self.post_ui("watch", *args) if watcher is self.watcher else None,
+            timeout=self.timeout_var.get()
+        )
+        self.watcher = watcher
+        self.check_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
+        self.watch_btn.config(text="⏹ Ngừng theo dõi")
+        self.status_var.set("👁 Đang theo dõi...")
+        watcher.start()
+
+    def stop_watch(self):
+        if not self.watcher:
+            return
+        self.watcher.stop()
+        self.watcher = None
+        self.check_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.watch_btn.config(text="👁 Theo dõi")
+        self.status_var.set("Đã dừng theo dõi")
+
+    def apply_watch_update(self, result, diff, events):
+        # Chạy trên luồng giao diện: chỉ cập nhật các dòng đã thay đổi
+        if self.watcher is None:
+            return
+        if diff is None:
+            self.status_var.set(f"👁 {result.error} - thử lại sau {self.watcher.interval:.0f} giây")
+            return
+
+        self.stats = result.stats
+        if self.result is None:
+            # Lần quét đầu tiên: hiển thị toàn bộ
+            self.result = result
+            self.update_process_list()
+        else:
+            self.apply_diff(result, diff)
+
+        self.append_timeline(events)
+        self.update_diagnostics()
+        status = f"👁 Đang theo dõi: {result.process_count} tiến trình"
+        if not diff.empty:
+            status += f" (+{len(diff.added)} / -{len(diff.removed)} / ~{len(diff.changed)})"
+        status += f" - quét lại sau {self.watcher.interval:.0f} giây"
+        self.status_var.set(status)
+
+    def apply_diff(self, result, diff):
+        # Chuyển bảng từ kết quả cũ sang kết quả mới mà không tạo lại các dòng không đổi
+        old = self.result
+        removed = {id(record) for record in diff.removed}
+
+        # Xóa dòng của process không còn chiếm dụng file
+        for record in diff.removed:
+            if record.item_id is not None:
+                self.process_tree.delete(record.item_id)
+                self.lazy_parents.pop(record.item_id, None)
+
+        # Giữ lại dòng và kết quả rủi ro của các process vẫn còn
+        for record in result:
+            old_record = old.get(record.pid)
+            if old_record is None or id(old_record) in removed:
+                continue
+            record.risk = old_record.risk
+            if old_record.item_id is not None:
+                result.bind_item(record, old_record.item_id)
+                lazy = self.lazy_parents.get(old_record.item_id)
+                if lazy:
+                    self.lazy_parents[old_record.item_id] = (record, lazy[1])
+        old.unbind_items()
+        self.result = result
+
+        # Process có danh sách file thay đổi: cập nhật số file và thu gọn danh sách file
+        for record in diff.changed:
+            item_id = record.item_id
+            if item_id is None:
+                continue
+            self.process_tree.set(item_id, "files", len(record.files))
+            if item_id not in self.lazy_parents:
+                children = self.process_tree.get_children(item_id)
+                if children:
+                    self.process_tree.delete(*children)
+                self.process_tree.item(item_id, open=False)
+                self.add_file_placeholder(item_id, record)
+        self.tree_loaders = {item_id: loader for item_id, loader in self.tree_loaders.items()
+                             if self.process_tree.exists(item_id)}
+
+        # Thứ tự phân trang theo kết quả mới; process mới được thêm vào cuối
+        order = []
+        loaded = 0
+        for index, record in enumerate(self.process_order):
+            # Bỏ process đã biến mất hoặc đã bị kill
+            if id(record) in removed or old.get(record.pid) is not record:
+                continue
+            order.append(result.get(record.pid))
+            if index < self.process_loaded:
+                loaded += 1
+        self.process_order = order
+        self.process_loaded = loaded
+        for record in diff.added:
+            self.process_order.append(record)
+            if self.more_processes_item is None:
+                self.insert_process_row(record)
+                self.process_loaded += 1
+        if self.more_processes_item is not None:
+            remaining = len(self.process_order) - self.process_loaded
+            self.process_tree.set(self.more_processes_item, "process",
+                                  f"… còn {remaining} tiến trình, chọn để tải thêm")
+
+        # Đánh giá rủi ro cho process mới
+        if diff.added:
+            rows = [(record.pid, record.name) for record in diff.added]
+            self.risk_pending += len(rows)
+            self.risk_executor.submit(self.score_risks, self.risk_generation, rows)
+
+    def toggle_timeline(self):
+        # Hiện/ẩn dòng thời gian
+        if self.timeline_visible:
+            self.timeline_text.pack_forget()
+            self.timeline_btn.config(text="▶ Timeline")
+        else:
+            self.timeline_text.pack(fill=tk.X, expand=True)
+            self.timeline_btn.config(text="▼ Timeline")
+        self.timeline_visible = not self.timeline_visible
+
+    def append_timeline(self, events):
+        # Chỉ thêm các sự kiện mới, giữ tối đa WATCH_TIMELINE_SIZE dòng
+        if not events:
+            return
+        self.timeline_text.config(state=tk.NORMAL)
+        for event in events[-WATCH_TIMELINE_SIZE:]:
+            self.timeline_text.insert(tk.END, format_timeline_event(event) + "\n")
+        line_count = int(self.timeline_text.index("end-1c").split(".")[0]) - 1
+        if line_count > WATCH_TIMELINE_SIZE:
+            self.timeline_text.delete("1.0", f"{line_count - WATCH_TIMELINE_SIZE + 1}.0")
+        self.timeline_text.see(tk.END)
+        self.timeline_text.config(state=tk.DISABLED)
+
+    def toggle_diagnostics(self):
+        # Hiện/ẩn khung chẩn đoán
+        if self.diagnostics_visible:
+            self.diagnostics_text.pack_forget()
+            self.diagnostics_btn.config(text="▶ Diagnostics")
+        else:
+            self.diagnostics_text.pack(fill=tk.X, expand=True)
+            self.diagnostics_btn.config(text="▼ Diagnostics")
+        self.diagnostics_visible = not self.diagnostics_visible
+
+    def update_diagnostics(self):
+        # Hiển thị số liệu đo đạc của lần kiểm tra gần nhất
+        self.diagnostics_text.config(state=tk.NORMAL)
+        self.diagnostics_text.delete(1.0, tk.END)
+        if self.stats:
+            self.diagnostics_text.insert(tk.END, "\n".join(self.stats.format()))
+        self.diagnostics_text.config(state=tk.DISABLED)
+
+    def on_lock_found(self, record, file_path):
+        # Được gọi từ thread kiểm tra, chuyển việc cập nhật bảng về luồng giao diện
+        self.post_ui("lock", record.pid, record.name, len(record.files))
+
+    def show_streamed_locks(self, locks):
+        # Kết quả cuối cùng đã được hiển thị, bỏ qua các cập nhật đến muộn
+        if self.result is not None:
+            return
+
+        for pid, (process_name, file_count) in locks.items():
+            item_id = self.streamed_items.get(pid)
+            if item_id:
+                self.process_tree.set(item_id, "files", file_count)
+            elif len(self.streamed_items) < PROCESS_PAGE_SIZE:
+                logging.debug(f"Hiển thị sớm process: {process_name} (PID: {pid})")
+                self.streamed_items[pid] = self.process_tree.insert('', 'end', values=(
+                    process_name,
+                    pid,
+                    file_count,
+                    "⏳ Đang kiểm tra",
+                    "Kill"
+                ))
+            else:
+                # Chỉ hiển thị trang đầu trong lúc kiểm tra, phần còn lại chờ kết quả cuối
+                self.streamed_items[pid] = None
+
+        self.status_var.set(f"Đang kiểm tra... đã tìm thấy {len(self.streamed_items)} tiến trình")
 
     def update_process_list(self):
         logging.debug("Cập nhật danh sách process trong bảng")
 
+        # Bỏ kết quả rủi ro còn đang chờ của lần hiển thị trước
+        self.risk_generation += 1
+        self.risk_pending = 0
+
         # Xóa tất cả các mục trong bảng
-        for item in self.process_tree.get_children():
-            self.process_tree.delete(item)
+        self.clear_process_tree()
 
         # Xóa thông tin process
         self.process_info_text.config(state=tk.NORMAL)
@@ -534,47 +626,179 @@ class LockedFileCheckerApp:
         self.process_info_text.config(state=tk.DISABLED)
 
         # Nếu không có process nào, thoát
-        if not self.process_info:
+        if self.result is None or not self.result.process_count:
             logging.debug("Không có process nào để hiển thị")
             return
 
-        # Thêm các process vào bảng
-        logging.debug(f"Thêm {len(self.process_info)} process vào bảng")
-        for process_key, process_data in self.process_info.items():
-            pid = process_data['pid']
-            process_name = process_data['name']
-            file_count = len(process_data['files'])
-
-            logging.debug(f"Xử lý process: {process_name} (PID: {pid}) - {file_count} files")
-
-            # Đánh giá rủi ro
-            risk_level, risk_short = self.get_risk_info(pid, process_name)
-            logging.debug(f"Đánh giá rủi ro: {risk_short} (level: {risk_level})")
-
-            # Xác định tag dựa trên mức độ rủi ro
-            tag = 'low_risk'
-            if risk_level == 1:
-                tag = 'medium_risk'
-            elif risk_level == 2:
-                tag = 'high_risk'
-
-            # Thêm vào bảng với nút Kill
-            item_id = self.process_tree.insert('', 'end', values=(
-                process_name,
-                pid,
-                file_count,
-                risk_short,
-                "Kill"
-            ), tags=(tag,))
-
-            # Lưu trữ item_id để dễ dàng tìm kiếm sau này
-            process_data['item_id'] = item_id
+        # Thêm trang đầu tiên của bảng ngay, cột rủi ro được điền sau khi đánh giá xong
+        logging.debug(f"Thêm {self.result.process_count} process vào bảng")
+        stats = self.stats or CheckStats()
+        self.process_order = list(self.result)
+        with stats.phase('render'):
+            self.load_more_processes()
+
+        # Đánh giá rủi ro cho mọi process trên luồng nền, kết quả được áp dụng theo lô
+        rows = [(record.pid, record.name) for record in self.process_order]
+        self.risk_pending = len(rows)
+        self.risk_executor.submit(self.score_risks, self.risk_generation, rows)
 
+        stats.update_peak_rss()
         logging.debug("Hoàn thành cập nhật danh sách process")
 
+    def clear_process_tree(self):
+        # Chỉ các trang đã hiển thị mới có dòng trên bảng nên việc xóa không phụ thuộc số kết quả
+        children = self.process_tree.get_children()
+        if children:
+            self.process_tree.delete(*children)
+        if self.result is not None:
+            self.result.unbind_items()
+        self.streamed_items = {}
+        self.process_order = []
+        self.process_loaded = 0
+        self.more_processes_item = None
+        self.lazy_parents = {}
+        self.tree_loaders = {}
+
+    def load_more_processes(self):
+        # Tạo dòng cho trang tiếp theo của danh sách process
+        self.more_processes_item = None
+        end = min(self.process_loaded + PROCESS_PAGE_SIZE, len(self.process_order))
+        for record in self.process_order[self.process_loaded:end]:
+            if self.result.get(record.pid) is not record:
+                continue  # Process đã bị kill
+            self.insert_process_row(record)
+        self.process_loaded = end
+
+        remaining = len(self.process_order) - end
+        if remaining > 0:
+            more_id = self.process_tree.insert('', 'end', values=(
+                f"… còn {remaining} tiến trình, chọn để tải thêm", "", "", "", ""
+            ), tags=('more',))
+            self.tree_loaders[more_id] = self.load_more_processes
+            self.more_processes_item = more_id
+
+    def insert_process_row(self, record):
+        # Tạo dòng cho một process (danh sách file được tạo khi mở rộng)
+        risk_level, risk_short = record.risk or (None, RISK_PENDING_TEXT)
+        tag = 'pending_risk' if risk_level is None else ('low_risk', 'medium_risk', 'high_risk')[risk_level]
+        item_id = self.process_tree.insert('', 'end', values=(
+            record.name,
+            record.pid,
+            len(record.files),
+            risk_short,
+            "Kill"
+        ), tags=(tag,))
+
+        # Lưu trữ item_id để tra cứu process từ dòng được chọn
+        self.result.bind_item(record, item_id)
+        self.add_file_placeholder(item_id, record)
+        return item_id
+
+    def add_file_placeholder(self, item_id, record):
+        # Dòng giữ chỗ để hiện nút mở rộng; danh sách file chỉ được tạo khi mở
+        if record.files:
+            placeholder = self.process_tree.insert(item_id, 'end', values=("⏳",))
+            self.lazy_parents[item_id] = (record, placeholder)
+
+    def load_files(self, item_id, record, start=0):
+        # Tạo dòng cho một trang file của process
+        if not self.process_tree.exists(item_id):
+            return
+
+        files = record.files
+        end = min(start + FILE_PAGE_SIZE, len(files))
+        for file_path in files[start:end]:
+            self.process_tree.insert(item_id, 'end', values=(file_path, "", "", "", ""), tags=('file',))
+
+        remaining = len(files) - end
+        if remaining > 0:
+            more_id = self.process_tree.insert(item_id, 'end', values=(
+                f"… còn {remaining} file, chọn để tải thêm", "", "", "", ""
+            ), tags=('more',))
+            self.tree_loaders[more_id] = lambda: self.load_files(item_id, record, end)
+
+    def on_process_open(self, _):
+        # Mở rộng một process lần đầu: thay dòng giữ chỗ bằng trang file đầu tiên
+        item_id = self.process_tree.focus()
+        lazy = self.lazy_parents.pop(item_id, None)
+        if lazy:
+            record, placeholder = lazy
+            self.process_tree.delete(placeholder)
+            self.load_files(item_id, record)
+
+    def score_risks(self, generation, rows):
+        """
+        Chạy trên luồng nền: chụp bảng process một lần rồi chia các process thành lô
+        để đánh giá rủi ro song song
+
+        Args:
+            generation: Số thứ tự lần hiển thị bảng mà các process thuộc về
+            rows: Danh sách (pid, tên process)
+        """
+        mark = CheckStats.mark()
+        try:
+            self.risk_assessor.refresh()
+        except Exception as e:
+            logging.error(f"Lỗi khi chụp bảng process: {str(e)}")
+        now = CheckStats.mark()
+        self.post_ui("risk", generation, [], (now[0] - mark[0], now[1] - mark[1]))
+
+        for start in range(0, len(rows), RISK_BATCH_SIZE):
+            if generation != self.risk_generation:
+                return
+            self.risk_executor.submit(self.score_risk_batch, generation, rows[start:start + RISK_BATCH_SIZE])
+
+    def score_risk_batch(self, generation, rows):
+        # Chạy trên luồng nền: đánh giá một lô process và đẩy kết quả cho luồng giao diện
+        if generation != self.risk_generation:
+            return
+        mark = CheckStats.mark()
+        results = []
+        for pid, process_name in rows:
+            try:
+                risk_level, risk_short = self.get_risk_info(pid, process_name)
+            except Exception as e:
+                logging.error(f"Lỗi khi đánh giá rủi ro cho {process_name} (PID: {pid}): {str(e)}")
+                risk_level, risk_short = 1, "⚠️ Trung bình"
+            results.append((pid, risk_level, risk_short))
+        now = CheckStats.mark()
+        self.post_ui("risk", generation, results, (now[0] - mark[0], now[1] - mark[1]))
+
+    def apply_risk_results(self, batches):
+        # Chạy trên luồng giao diện: điền cột rủi ro và màu dòng cho các lô đã xong
+        generation = self.risk_generation
+        if self.risk_pending <= 0:
+            return
+
+        stats = self.stats or CheckStats()
+        mark = stats.mark()
+        for batch_generation, results, (wall, cpu) in batches:
+            # Bỏ kết quả của bảng đã được thay thế
+            if batch_generation != generation:
+                continue
+            stats.add('risk', wall, cpu, max(len(results), 1))
+            for pid, risk_level, risk_short in results:
+                record = self.result.get(pid) if self.result else None
+                if record is None:
+                    continue
+                # Lưu lại để các trang chưa hiển thị dùng ngay khi được tạo
+                record.risk = (risk_level, risk_short)
+                item_id = record.item_id
+                if item_id is None:
+                    continue
+                tag = ('low_risk', 'medium_risk', 'high_risk')[risk_level]
+                self.process_tree.set(item_id, 'risk', risk_short)
+                self.process_tree.item(item_id, tags=(tag,))
+            self.risk_pending -= len(results)
+        stats.lap('render', mark)
+
+        if self.risk_pending <= 0:
+            logging.debug("Đã đánh giá rủi ro xong cho tất cả process")
+            self.update_diagnostics()
+
     def get_risk_info(self, pid, process_name):
         """Trả về thông tin rủi ro ngắn gọn cho bảng và thông tin chi tiết"""
-        risk_level, _ = assess_process_risk(pid, process_name)
+        risk_level, _ = self.risk_assessor.assess(pid, process_name)
 
         # Tạo thông tin ngắn gọn cho bảng
         if risk_level == 0:
@@ -594,23 +818,28 @@ class LockedFileCheckerApp:
 
         item_id = selection[0]
 
-        # Tìm process_key tương ứng với item_id
-        process_key = None
-        for key, data in self.process_info.items():
-            if data.get('item_id') == item_id:
-                process_key = key
-                break
+        # Dòng "tải thêm": tạo trang tiếp theo thay cho dòng này
+        loader = self.tree_loaders.pop(item_id, None)
+        if loader:
+            self.process_tree.delete(item_id)
+            loader()
+            return
+
+        # Chưa có kết quả cuối cùng (đang hiển thị dữ liệu tạm trong lúc kiểm tra)
+        if self.result is None:
+            return
 
-        if not process_key:
+        # Dòng file: hiển thị thông tin của process chứa file
+        record = self.result.find_item(self.process_tree.parent(item_id) or item_id)
+        if record is None:
             return
 
         # Hiển thị thông tin process
-        process_data = self.process_info[process_key]
-        pid = process_data['pid']
-        process_name = process_data['name']
+        pid = record.pid
+        process_name = record.name
 
-        # Đánh giá rủi ro
-        risk_level, risk_desc = assess_process_risk(pid, process_name)
+        # Đánh giá rủi ro (dùng kết quả đã ghi nhớ từ lúc hiển thị bảng)
+        risk_level, risk_desc = self.risk_assessor.assess(pid, process_name)
 
         # Hiển thị thông tin
         self.process_info_text.config(state=tk.NORMAL)
@@ -619,32 +848,32 @@ class LockedFileCheckerApp:
         # Thêm thông tin cơ bản
         self.process_info_text.insert(tk.END, f"Tên: {process_name}\n")
         self.process_info_text.insert(tk.END, f"PID: {pid}\n")
-        self.process_info_text.insert(tk.END, f"Chi tiết: {process_data['details']}\n")
-        self.process_info_text.insert(tk.END, f"Số file bị chiếm dụng: {len(process_data['files'])}\n\n")
+        self.process_info_text.insert(tk.END, f"Chi tiết: {record.details}\n")
+        if record.roots:
+            self.process_info_text.insert(tk.END, f"Thư mục: {', '.join(record.roots)}\n")
+        self.process_info_text.insert(tk.END, f"Số file bị chiếm dụng: {len(record.files)}\n\n")
 
         # Thêm danh sách file bị chiếm dụng
         self.process_info_text.insert(tk.END, "File bị chiếm dụng:\n")
-        for i, file in enumerate(process_data['files'], 1):
-            if i <= 5:  # Chỉ hiển thị tối đa 5 file
-                self.process_info_text.insert(tk.END, f"  {i}. {file}\n")
+        for i, file in enumerate(record.files[:5], 1):  # Chỉ hiển thị tối đa 5 file
+            self.process_info_text.insert(tk.END, f"  {i}. {file}\n")
 
-        if len(process_data['files']) > 5:
-            self.process_info_text.insert(tk.END, f"  ... và {len(process_data['files']) - 5} file khác\n")
+        if len(record.files) > 5:
+            self.process_info_text.insert(tk.END, f"  ... và {len(record.files) - 5} file khác\n")
 
         self.process_info_text.insert(tk.END, "\n")
 
         # Thêm thông tin rủi ro với màu sắc tương ứng
+        risk_start = self.process_info_text.index("end-1c")
         self.process_info_text.insert(tk.END, risk_desc)
 
         # Đặt màu cho phần đánh giá rủi ro
+        self.process_info_text.tag_add("risk", risk_start, "end")
         if risk_level == 2:  # Cao
-            self.process_info_text.tag_add("risk", f"{6 + min(5, len(process_data['files']))}.0", "end")
             self.process_info_text.tag_config("risk", foreground="red")
         elif risk_level == 1:  # Trung bình
-            self.process_info_text.tag_add("risk", f"{6 + min(5, len(process_data['files']))}.0", "end")
             self.process_info_text.tag_config("risk", foreground="orange")
         else:  # Thấp
-            self.process_info_text.tag_add("risk", f"{6 + min(5, len(process_data['files']))}.0", "end")
             self.process_info_text.tag_config("risk", foreground="green")
 
         self.process_info_text.config(state=tk.DISABLED)
@@ -676,25 +905,26 @@ class LockedFileCheckerApp:
         item_id = selection[0]
         logging.debug(f"Item được chọn: {item_id}")
 
-        # Lấy thông tin process từ item được chọn
-        values = self.process_tree.item(item_id, 'values')
-        process_name = values[0]
-        pid = int(values[1])
-        logging.info(f"Chuẩn bị kill process: {process_name} (PID: {pid})")
+        # Chỉ dòng process mới có nút Kill (bỏ qua dòng file và dòng "tải thêm")
+        if self.process_tree.parent(item_id) or item_id in self.tree_loaders:
+            return
 
-        # Tìm process_key tương ứng
-        process_key = None
-        for key, data in self.process_info.items():
-            if data.get('pid') == pid:
-                process_key = key
-                break
+        if self.result is None:
+            logging.debug("Chưa có kết quả kiểm tra hoàn chỉnh")
+            return
 
-        if not process_key:
-            logging.warning(f"Không tìm thấy process_key cho PID: {pid}")
+        # Lấy thông tin process từ item được chọn
+        record = self.result.find_item(item_id)
+        if record is None:
+            logging.warning(f"Không tìm thấy process cho dòng: {item_id}")
             return
 
+        process_name = record.name
+        pid = record.pid
+        logging.info(f"Chuẩn bị kill process: {process_name} (PID: {pid})")
+
         # Đánh giá rủi ro
-        risk_level, risk_desc = assess_process_risk(pid, process_name)
+        risk_level, risk_desc = self.risk_assessor.assess(pid, process_name)
         logging.debug(f"Đánh giá rủi ro: level={risk_level}, desc={risk_desc}")
 
         # Hiển thị hộp thoại xác nhận với thông tin rủi ro
@@ -715,7 +945,10 @@ class LockedFileCheckerApp:
 
                 # Xóa process khỏi bảng
                 self.process_tree.delete(item_id)
-                del self.process_info[process_key]
+                self.lazy_parents.pop(item_id, None)
+                self.result.remove(pid)
+                # Ảnh chụp dùng chung (cục bộ hoặc của dịch vụ) vẫn chứa các file của process đã kill
+                self.snapshot_stale = True
 
                 # Xóa thông tin process
                 self.process_info_text.config(state=tk.NORMAL)
@@ -726,7 +959,7 @@ class LockedFileCheckerApp:
                 self.status_var.set(message)
 
                 # Nếu không còn process nào, chạy lại kiểm tra
-                if not self.process_info:
+                if not self.result.process_count and not self.watcher:
                     logging.debug("Không còn process nào, chạy lại kiểm tra")
                     self.run_check()
             else:
@@ -736,15 +969,21 @@ class LockedFileCheckerApp:
         else:
             logging.info(f"Người dùng hủy kill process {process_name} (PID: {pid})")
 
-    def run_check(self):
+    def refresh_check(self):
+        # Kiểm tra lại với ảnh chụp mới, bỏ qua ảnh chụp còn hạn trong cache
+        self.run_check(refresh=True)
+
+    def run_check(self, refresh=False):
         logging.info("Bắt đầu kiểm tra file bị chiếm dụng từ giao diện")
+        self.stop_watch()
 
-        folder = self.folder_var.get().strip()
-        logging.debug(f"Thư mục cần kiểm tra: {folder}")
+        folders = self.get_folders()
+        logging.debug(f"Thư mục cần kiểm tra: {folders}")
 
-        if not folder or not os.path.exists(folder):
-            logging.warning(f"Thư mục không hợp lệ: {folder}")
-            messagebox.showerror("Lỗi", "Vui lòng chọn thư mục hợp lệ.")
+        invalid_folders = [folder for folder in folders if not os.path.exists(folder)]
+        if not folders or invalid_folders:
+            logging.warning(f"Thư mục không hợp lệ: {invalid_folders}")
+            messagebox.showerror("Lỗi", "Vui lòng chọn thư mục hợp lệ.\n\n" + "\n".join(invalid_folders))
             return
 
         # Vô hiệu hóa nút kiểm tra và kích hoạt nút dừng
@@ -754,92 +993,141 @@ class LockedFileCheckerApp:
         self.is_checking = True
         self.status_var.set("Đang kiểm tra...")
 
-        # Xóa kết quả cũ
-        logging.debug("Xóa kết quả cũ")
-        self.output_box.delete(1.0, tk.END)
-
         # Xóa danh sách process cũ
         logging.debug("Xóa danh sách process cũ")
-        for item in self.process_tree.get_children():
-            self.process_tree.delete(item)
-        self.process_info = None
+        self.risk_generation += 1
+        self.clear_process_tree()
+        self.result = None
+        self.stats = CheckStats(detailed=self.detailed_stats_var.get())
 
         # Xóa thông tin process
         self.process_info_text.config(state=tk.NORMAL)
         self.process_info_text.delete(1.0, tk.END)
         self.process_info_text.config(state=tk.DISABLED)
 
-        # Chạy kiểm tra trong luồng riêng
+        # Mỗi lần kiểm tra có cờ hủy riêng; kết quả đến muộn của lần trước bị bỏ qua
+        token = self.cancel_token = CancellationToken()
+
+        def current(handler):
+            return lambda *args: handler(*args) if token is self.cancel_token else None
+
+        refresh = refresh or self.snapshot_stale
+        self.snapshot_stale = False
+
+        if self.service_client:
+            # Thin client: dịch vụ trả lời từ ảnh chụp của nó
+            target = self.service_client.check_locked_folders
+            check_kwargs = {'refresh': refresh}
+        else:
+            target = check_locked_folders
+            check_kwargs = {
+                'on_lock': current(self.on_lock_found),
+                'stats': self.stats,
+                'partial': self.partial_results_var.get(),
+                'cache': SNAPSHOT_CACHE if self.snapshot_cache_var.get() else None,
+                'refresh': refresh,
+            }
+
+        # Chạy kiểm tra trong luồng riêng (nhiều thư mục: chạy handle.exe một lần cho tất cả)
         logging.debug("Khởi động thread kiểm tra")
         self.check_thread = threading.Thread(
-            target=check_locked_files,
-            args=(folder, self.update_output)
+            target=target,
+            args=(folders, current(self.on_check_result)),
+            kwargs={
+                'cancel_token': token,
+                'timeout': self.timeout_var.get(),
+                'progress': current(self.show_progress),
+                **check_kwargs,
+            }
         )
         self.check_thread.daemon = True
         self.check_thread.start()
         logging.debug("Đã khởi động thread kiểm tra")
 
     def stop_check(self):
-        if self.is_checking:
-            self.status_var.set("Đã hủy")
-            self.check_btn.config(state=tk.NORMAL)
+        if self.watcher:
+            self.stop_watch()
+            return
+        if self.is_checking and self.cancel_token:
+            logging.info("Người dùng hủy kiểm tra")
+            self.status_var.set("Đang hủy...")
             self.stop_btn.config(state=tk.DISABLED)
-            self.is_checking = False
-            # Không thể dừng subprocess trực tiếp, nhưng có thể đánh dấu là đã hủy
-            self.output_box.insert(tk.END, "\n\n⚠️ Đã hủy thao tác kiểm tra.")
-
-    def save_results(self):
-        # Kiểm tra xem có tiến trình nào không
-        if not self.process_info:
-            # Lấy nội dung từ output_box ẩn
-            content = self.output_box.get(1.0, tk.END).strip()
-            if not content:
-                messagebox.showinfo("Thông báo", "Không có kết quả để lưu.")
-                return
-        else:
-            # Tạo nội dung từ bảng tiến trình
-            content = "DANH SÁCH TIẾN TRÌNH ĐANG CHIẾM DỤNG FILE\n"
-            content += "=" * 50 + "\n\n"
-
-            for process_key, process_data in self.process_info.items():
-                pid = process_data['pid']
-                process_name = process_data['name']
-                file_count = len(process_data['files'])
-
-                # Đánh giá rủi ro
-                _, risk_desc = assess_process_risk(pid, process_name)
-
-                content += f"Tiến trình: {process_name}\n"
-                content += f"PID: {pid}\n"
-                content += f"Số file bị chiếm dụng: {file_count}\n"
-                content += f"Chi tiết: {process_data['details']}\n"
-                content += f"Đánh giá rủi ro: {risk_desc}\n\n"
+            # Dừng handle.exe ngay; thread kiểm tra sẽ trả kết quả (một phần hoặc thông báo hủy) qua callback
+            self.cancel_token.cancel()
+
+    def set_timeout(self):
+        # Cấu hình thời gian chờ tối đa cho các lần kiểm tra tiếp theo
+        value = simpledialog.askinteger("Thời gian chờ", "Thời gian chờ tối đa cho mỗi lần kiểm tra (giây):",
+                                        initialvalue=self.timeout_var.get(), minvalue=1, parent=self.root)
+        if value:
+            self.timeout_var.set(value)
+            self.status_var.set(f"Thời gian chờ: {value} giây")
+
+    def connect_service(self):
+        # Kiểm tra qua dịch vụ chạy nền (để trống địa chỉ để tự quét trên máy này)
+        url = simpledialog.askstring(
+            "Kết nối dịch vụ",
+            "Địa chỉ dịch vụ (python -m lockfilechecker serve), để trống để tự quét:",
+            initialvalue=self.service_client.url if self.service_client else SERVICE_URL,
+            parent=self.root
+        )
+        if url is None:
+            return
+        url = url.strip()
+        if not url:
+            self.service_client = None
+            self.status_var.set("Tự quét trên máy này")
+            return
 
-                content += "Danh sách file bị chiếm dụng:\n"
-                for i, file in enumerate(process_data['files'], 1):
-                    content += f"  {i}. {file}\n"
+        client = LockServiceClient(url)
+        try:
+            status = client.status()
+        except Exception as e:
+            logging.error(f"Không kết nối được dịch vụ {url}: {e}")
+            messagebox.showerror("Lỗi", f"Không kết nối được dịch vụ {url}:\n{e}")
+            return
+        self.service_client = client
+        self.status_var.set(f"Đã kết nối dịch vụ {client.url} [{status['backend']}], "
+                            f"{status['open_files']} file đang mở")
 
-                content += "\n" + "-" * 50 + "\n\n"
+    def save_results(self):
+        # Kiểm tra xem có kết quả nào không
+        if self.result is None:
+            messagebox.showinfo("Thông báo", "Không có kết quả để lưu.")
+            return
 
         # Tạo tên file mặc định với timestamp
         default_filename = f"locked_files_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            filetypes=[
+                ("Text files", "*.txt"),
+                ("JSON", "*.json"),
+                ("NDJSON", "*.ndjson"),
+                ("CSV", "*.csv"),
+                ("All files", "*.*"),
+            ],
             initialfile=default_filename
         )
 
         if file_path:
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                messagebox.showinfo("Thành công", f"Đã lưu kết quả vào file:\n{file_path}")
+                # Ghi trực tiếp từng dòng ra file; rủi ro lấy từ kết quả đã ghi nhớ
+                fmt = save_result(self.result, file_path,
+                                  risk=lambda record: self.risk_assessor.assess(record.pid, record.name))
+                messagebox.showinfo("Thành công", f"Đã lưu kết quả ({fmt}) vào file:\n{file_path}")
             except Exception as e:
                 messagebox.showerror("Lỗi", f"Không thể lưu file: {str(e)}")
 
     def clear_results(self):
-        self.output_box.delete(1.0, tk.END)
+        self.risk_generation += 1
+        self.risk_pending = 0
+        self.clear_process_tree()
+        self.result = None
+        self.process_info_text.config(state=tk.NORMAL)
+        self.process_info_text.delete(1.0, tk.END)
+        self.process_info_text.config(state=tk.DISABLED)
         self.status_var.set("Đã xóa kết quả")
 
     def show_help(self):
@@ -879,10 +1167,11 @@ Tính năng:
 - Kill tiến trình trực tiếp từ bảng với xác nhận
 - Hiển thị thông tin chi tiết về tiến trình được chọn
 - Lưu kết quả kiểm tra
+- Chạy trên Linux bằng cách đọc /proc (không cần handle.exe)
 
 Sử dụng:
 - Python và Tkinter cho giao diện
-- Handle.exe từ Sysinternals (Microsoft)
+- Handle.exe từ Sysinternals (Microsoft) trên Windows, /proc trên Linux
 - psutil cho quản lý tiến trình
 
 © 2023 - MIT License
@@ -891,10 +1180,15 @@ Sử dụng:
 
     def on_closing(self):
         if self.is_checking:
-            if messagebox.askyesno("Xác nhận", "Đang trong quá trình kiểm tra. Bạn có chắc muốn thoát?"):
-                self.root.destroy()
-        else:
-            self.root.destroy()
+            if not messagebox.askyesno("Xác nhận", "Đang trong quá trình kiểm tra. Bạn có chắc muốn thoát?"):
+                return
+            # Dừng handle.exe thay vì để nó chạy tiếp sau khi đóng cửa sổ
+            self.cancel_token.cancel()
+        if self.watcher:
+            self.watcher.stop()
+        self.risk_generation += 1
+        self.risk_executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
 # Khởi chạy ứng dụng
 if __name__ == "__main__":
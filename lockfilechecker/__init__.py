@@ -0,0 +1,6 @@
+"""
+LockFileChecker: kiểm tra các file đang bị tiến trình khác chiếm dụng
+
+    lockfilechecker.core  Lõi kiểm tra (không phụ thuộc giao diện)
+    lockfilechecker.cli   Giao diện dòng lệnh: python -m lockfilechecker check PATH
+"""
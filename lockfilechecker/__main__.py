@@ -0,0 +1,5 @@
+import sys
+
+from lockfilechecker.cli import main
+
+sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Giao diện dòng lệnh cho pipeline deploy (không cần tkinter)
+
+Cách dùng:
+    python -m lockfilechecker check C:\\inetpub\\wwwroot\\site
+    python -m lockfilechecker check D:\\app1 D:\\app2 --json
+    python -m lockfilechecker check /srv/app --format csv -o locks.csv --timeout 30
+    python -m lockfilechecker serve --port 8765
+    python -m lockfilechecker check D:\\app --server http://127.0.0.1:8765
+
+Mã thoát:
+    0  Không có file bị khóa
+    1  Có file bị khóa
+    2  Lỗi (không chạy được backend, hết thời gian chờ, tham số sai...)
+    3  Kiểm tra dừng giữa chừng (--partial) và chưa thấy file bị khóa
+
+Lõi kiểm tra (lockfilechecker.core) chỉ được nạp sau khi phân tích tham số,
+psutil chỉ được nạp khi cần đánh giá rủi ro (--risk) và handle.exe chỉ được
+xác định khi chạy backend handle, để mỗi lần gọi khởi động nhanh.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+EXIT_CLEAR = 0
+EXIT_LOCKED = 1
+EXIT_ERROR = 2
+EXIT_INCOMPLETE = 3
+
+OUTPUT_FORMATS = ("text", "json", "ndjson", "csv")
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="lockfilechecker",
+        description="Kiểm tra các file đang bị tiến trình khác chiếm dụng",
+    )
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="Ghi log chi tiết ra stderr (-v: INFO, -vv: DEBUG)")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    check = commands.add_parser("check", help="Kiểm tra file bị khóa trong các thư mục",
+                                description="Kiểm tra file bị khóa trong một hoặc nhiều thư mục "
+                                            "(một lần liệt kê file đang mở cho tất cả)")
+    check.add_argument("paths", nargs="+", metavar="PATH", help="Thư mục (hoặc file) cần kiểm tra")
+    check.add_argument("--json", dest="format", action="store_const", const="json",
+                       help="Xuất JSON (viết tắt của --format json)")
+    check.add_argument("--format", choices=OUTPUT_FORMATS, help="Định dạng kết quả (mặc định: text)")
+    check.add_argument("-o", "--output", metavar="FILE", help="Ghi kết quả ra file thay vì stdout")
+    check.add_argument("-q", "--quiet", action="store_true", help="Không in kết quả, chỉ trả mã thoát")
+    check.add_argument("--backend", choices=("handle", "procfs"), help="Backend liệt kê file đang mở")
+    check.add_argument("--strategy", choices=("auto", "filtered", "full"), default="auto",
+                       help="Chiến lược truy vấn handle.exe (mặc định: auto)")
+    check.add_argument("--timeout", type=float, metavar="SECONDS", help="Thời gian chờ tối đa (giây)")
+    check.add_argument("--partial", action="store_true",
+                       help="Trả kết quả một phần thay vì lỗi khi hết thời gian chờ")
+    check.add_argument("--risk", action="store_true", help="Kèm đánh giá rủi ro khi kill từng tiến trình")
+    check.add_argument("--timing", action="store_true", help="In thời gian khởi động và kiểm tra ra stderr")
+    check.add_argument("--server", metavar="URL", help="Truy vấn dịch vụ đang chạy (xem lệnh serve) thay vì tự quét")
+    check.add_argument("--refresh", action="store_true", help="Với --server: buộc dịch vụ chụp lại")
+    check.set_defaults(format="text", handler=run_check)
+
+    serve = commands.add_parser("serve", help="Chạy dịch vụ truy vấn file bị khóa trên localhost",
+                                description="Giữ sẵn ảnh chụp file đang mở, làm mới theo chu kỳ và trả lời "
+                                            "truy vấn qua HTTP trên localhost")
+    serve.add_argument("--host", default="127.0.0.1", help="Địa chỉ lắng nghe (mặc định: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Cổng lắng nghe (mặc định: 8765)")
+    serve.add_argument("--interval", type=float, default=5, metavar="SECONDS",
+                       help="Chu kỳ làm mới ảnh chụp (mặc định: 5 giây)")
+    serve.add_argument("--backend", choices=("handle", "procfs"), help="Backend liệt kê file đang mở")
+    serve.add_argument("--timeout", type=float, metavar="SECONDS", help="Thời gian chờ tối đa cho một lần chụp")
+    serve.set_defaults(handler=run_serve)
+    return parser
+
+def configure_logging(verbose):
+    level = logging.WARNING if not verbose else logging.INFO if verbose == 1 else logging.DEBUG
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stderr,
+    )
+
+def exit_code(result):
+    """Mã thoát tương ứng với một LockResult"""
+    if result.error:
+        return EXIT_ERROR
+    if result.process_count:
+        return EXIT_LOCKED
+    if result.query_info and result.query_info.get('incomplete'):
+        return EXIT_INCOMPLETE
+    return EXIT_CLEAR
+
+def run_check(args, started):
+    invalid_paths = [path for path in args.paths if not os.path.exists(path)]
+    if invalid_paths:
+        print("❌ Đường dẫn không tồn tại: " + ", ".join(invalid_paths), file=sys.stderr)
+        return EXIT_ERROR
+
+    from lockfilechecker import core
+
+    check_start = time.perf_counter()
+    if args.server:
+        from lockfilechecker.service import LockServiceClient
+
+        client = LockServiceClient(args.server, args.timeout)
+        result = client.check_locked_folders(args.paths, refresh=args.refresh, risk=args.risk)
+    else:
+        backend = core.get_lock_backend(args.backend)
+        result = core.check_locked_folders(args.paths, strategy=args.strategy, stats=core.CheckStats(),
+                                           backend=backend, timeout=args.timeout, partial=args.partial)
+    check_elapsed = time.perf_counter() - check_start
+
+    risk = None
+    if args.risk and result.process_count:
+        if args.server:
+            # Dịch vụ đã đánh giá rủi ro bằng bảng process của nó
+            risk = lambda record: record.risk or (None, "")  # noqa: E731
+        else:
+            assessor = core.RiskAssessor()
+            risk = lambda record: assessor.assess(record.pid, record.name)  # noqa: E731
+
+    if result.error:
+        print(result.error, file=sys.stderr)
+    elif args.output:
+        core.save_result(result, args.output, args.format, risk)
+    elif not args.quiet:
+        core.EXPORT_FORMATS[args.format](result, sys.stdout, risk)
+
+    if args.timing:
+        print(f"Khởi động: {(check_start - started) * 1000:.1f} ms, "
+              f"kiểm tra: {check_elapsed * 1000:.1f} ms", file=sys.stderr)
+    return exit_code(result)
+
+def run_serve(args, started):
+    from lockfilechecker import core
+    from lockfilechecker.service import serve
+
+    print(f"Dịch vụ lắng nghe tại http://{args.host}:{args.port} (Ctrl+C để dừng)", file=sys.stderr)
+    serve(args.host, args.port, core.get_lock_backend(args.backend), args.interval, args.timeout)
+    return EXIT_CLEAR
+
+def main(argv=None):
+    """
+    Chạy CLI
+
+    Args:
+        argv: Danh sách tham số (None để dùng sys.argv)
+
+    Returns:
+        Mã thoát (EXIT_CLEAR, EXIT_LOCKED, EXIT_ERROR hoặc EXIT_INCOMPLETE)
+    """
+    started = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    configure_logging(args.verbose)
+
+    # Tránh lỗi khi console không hiển thị được emoji/tiếng Việt (ví dụ cp1252 trên Windows)
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(errors="replace")
+
+    try:
+        return args.handler(args, started)
+    except KeyboardInterrupt:
+        print("🛑 Đã hủy thao tác kiểm tra.", file=sys.stderr)
+        return EXIT_ERROR
+    except OSError as e:
+        print(f"❌ Lỗi: {e}", file=sys.stderr)
+        return EXIT_ERROR
@@ -0,0 +1,1896 @@
+"""
+Lõi kiểm tra file bị khóa: liệt kê file đang mở, gom theo thư mục, đánh giá
+rủi ro, xuất kết quả và theo dõi liên tục
+
+Module này không phụ thuộc giao diện (không import tkinter) và chỉ nạp psutil
+hoặc xác định handle.exe khi thực sự cần, để CLI khởi động nhanh. Ứng dụng
+chủ động cấu hình logging (giao diện: DEBUG, CLI: theo tham số).
+"""
+import os
+import sys
+import subprocess
+import threading
+import time
+from datetime import datetime
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+import locale
+import re
+import csv
+import json
+import logging
+
+# Tự động xác định phiên bản handle.exe phù hợp (chỉ một lần, khi cần chạy handle.exe)
+@lru_cache(maxsize=None)
+def get_handle_path():
+    logging.debug("Bắt đầu xác định đường dẫn handle.exe")
+    import platform
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    handle_dir = os.path.join(os.path.dirname(package_dir), "Handle")
+    logging.debug(f"Thư mục Handle: {handle_dir}")
+
+    # Kiểm tra kiến trúc hệ thống
+    machine = platform.machine()
+    logging.debug(f"Kiến trúc hệ thống: {machine}")
+
+    if machine.endswith('64'):
+        # Kiểm tra nếu là ARM64
+        if 'ARM' in machine.upper():
+            handle_exe = "handle64a.exe"
+            logging.debug("Đã chọn handle64a.exe (ARM64)")
+        else:
+            handle_exe = "handle64.exe"
+            logging.debug("Đã chọn handle64.exe (x64)")
+    else:
+        handle_exe = "handle.exe"
+        logging.debug("Đã chọn handle.exe (x86)")
+
+    full_path = os.path.join(handle_dir, handle_exe)
+    logging.debug(f"Đường dẫn đầy đủ: {full_path}")
+
+    if os.path.exists(full_path):
+        logging.debug(f"File {handle_exe} tồn tại")
+    else:
+        logging.warning(f"File {handle_exe} không tồn tại")
+
+    return full_path
+
+HANDLE_EXE = None  # Đường dẫn tới handle.exe, None để tự xác định theo hệ thống (get_handle_path)
+HANDLE_TIMEOUT = 60  # Thời gian chờ tối đa (giây) cho một lần chạy handle.exe
+DEBUG_PREVIEW_LINES = 100  # Số dòng output handle.exe giữ lại để hiển thị debug
+
+# Chiến lược truy vấn handle.exe
+QUERY_AUTO = "auto"          # Tự chọn: lọc theo thư mục nếu được, nếu không thì quét toàn bộ
+QUERY_FILTERED = "filtered"  # handle.exe <đường dẫn>: handle.exe tự lọc theo tên
+QUERY_FULL = "full"          # handle.exe -a: liệt kê mọi handle rồi lọc bằng Python
+
+# Backend liệt kê file đang mở: "handle", "procfs" hoặc None để tự chọn theo hệ điều hành
+LOCK_BACKEND = None
+PROCFS_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Số luồng đọc /proc song song
+
+# Mô tả khi kết quả chỉ là một phần (query_info['incomplete'])
+INCOMPLETE_LABELS = {
+    "cancelled": "⚠️ Kết quả chưa đầy đủ: đã hủy kiểm tra giữa chừng",
+    "timeout": "⚠️ Kết quả chưa đầy đủ: quá thời gian chờ",
+}
+
+RISK_CACHE_TTL = 30  # Thời gian (giây) giữ kết quả đánh giá rủi ro và ảnh chụp bảng process
+RISK_WORKERS = min(8, os.cpu_count() or 1)  # Số luồng đánh giá rủi ro nền
+RISK_BATCH_SIZE = 200  # Số process đánh giá trong một lô
+
+KILL_GRACE_TIMEOUT = 5  # Thời gian (giây) chờ process tự thoát sau terminate() trước khi kill()
+KILL_WAIT_TIMEOUT = 3  # Thời gian (giây) chờ process thoát sau kill()
+
+SNAPSHOT_TTL = 10  # Thời gian (giây) dùng lại ảnh chụp toàn hệ thống cho các lần kiểm tra liên tiếp
+
+# Chế độ theo dõi: quét lại theo chu kỳ, giãn dần khi không có thay đổi
+WATCH_MIN_INTERVAL = 2  # Chu kỳ quét ngắn nhất (giây), dùng lại ngay khi có thay đổi
+WATCH_MAX_INTERVAL = 30  # Chu kỳ quét dài nhất (giây)
+WATCH_BACKOFF = 1.5  # Hệ số giãn chu kỳ sau mỗi lần quét không có thay đổi
+WATCH_TIMELINE_SIZE = 1000  # Số sự kiện khóa/mở khóa giữ lại trong dòng thời gian
+
+# Hàm đánh giá rủi ro khi kill process
+def assess_process_risk(pid, process_name, snapshot=None):
+    """
+    Đánh giá rủi ro khi kill một process
+
+    Args:
+        pid: Process ID
+        process_name: Tên process
+        snapshot: ProcessSnapshot dùng để đếm tiến trình con (None = hỏi psutil trực tiếp)
+
+    Returns:
+        Tuple (mức độ rủi ro, mô tả rủi ro)
+        Mức độ rủi ro: 0 = thấp, 1 = trung bình, 2 = cao
+    """
+    logging.debug(f"Đánh giá rủi ro cho process: {process_name} (PID: {pid})")
+    import psutil
+
+    try:
+        # Danh sách các process quan trọng của hệ thống
+        critical_processes = [
+            "system", "winlogon", "services", "lsass", "svchost", "csrss",
+            "smss", "wininit", "explorer", "spoolsv", "taskmgr"
+        ]
+
+        # Danh sách các process thường gặp và ít rủi ro
+        safe_processes = [
+            "chrome", "firefox", "msedge", "iexplore", "notepad", "wordpad",
+            "winword", "excel", "powerpnt", "outlook", "code", "devenv"
+        ]
+
+        # Chuyển process_name về chữ thường để so sánh
+        process_name_lower = process_name.lower()
+        logging.debug(f"Process name (lowercase): {process_name_lower}")
+
+        # Kiểm tra nếu là process hệ thống quan trọng
+        for proc in critical_processes:
+            if proc in process_name_lower:
+                logging.warning(f"Process {process_name} được xác định là tiến trình hệ thống quan trọng (rủi ro cao)")
+                return (2, f"⚠️ RỦI RO CAO: {process_name} là tiến trình hệ thống quan trọng. "
+                           f"Việc kill có thể gây mất ổn định hoặc crash hệ thống.")
+
+        # Kiểm tra nếu là process an toàn
+        for proc in safe_processes:
+            if proc in process_name_lower:
+                logging.debug(f"Process {process_name} được xác định là ứng dụng thông thường (rủi ro thấp)")
+                return (0, f"✅ RỦI RO THẤP: {process_name} là ứng dụng thông thường. "
+                           f"Có thể kill nhưng bạn có thể mất dữ liệu chưa lưu.")
+
+        # Kiểm tra số lượng child process
+        try:
+            if snapshot is not None:
+                children = snapshot.descendants(pid)
+            else:
+                children = psutil.Process(pid).children(recursive=True)
+            logging.debug(f"Process {process_name} có {len(children)} tiến trình con")
+
+            if len(children) > 3:
+                logging.info(f"Process {process_name} có nhiều tiến trình con ({len(children)}) - rủi ro trung bình")
+                return (1, f"⚠️ RỦI RO TRUNG BÌNH: {process_name} có {len(children)} tiến trình con. "
+                           f"Việc kill có thể ảnh hưởng đến các ứng dụng khác.")
+        except Exception as child_error:
+            logging.error(f"Lỗi khi kiểm tra tiến trình con: {str(child_error)}")
+
+        # Mặc định là rủi ro trung bình
+        logging.debug(f"Process {process_name} được đánh giá mặc định là rủi ro trung bình")
+        return (1, f"⚠️ RỦI RO TRUNG BÌNH: {process_name} không phải là tiến trình hệ thống quan trọng "
+                   f"nhưng cũng không phải ứng dụng thông thường. Hãy cẩn thận khi kill.")
+
+    except Exception as e:
+        logging.exception(f"Lỗi khi đánh giá rủi ro cho process {process_name}: {str(e)}")
+        return (1, f"⚠️ RỦI RO KHÔNG XÁC ĐỊNH: Không thể đánh giá rủi ro cho {process_name}. {str(e)}")
+
+
+class ProcessSnapshot:
+    """
+    Ảnh chụp bảng process tại một thời điểm (một lần duyệt psutil.process_iter)
+    kèm chỉ mục cha → con, để đếm tiến trình con mà không phải duyệt lại toàn hệ thống
+    cho từng process.
+    """
+
+    def __init__(self):
+        import psutil
+
+        self.taken_at = time.monotonic()
+        self.processes = {}  # pid -> (name, ppid, create_time)
+        self.children = {}  # ppid -> [pid, ...]
+
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'create_time']):
+            info = proc.info
+            pid = info.get('pid')
+            if pid is None:
+                continue
+            ppid = info.get('ppid')
+            self.processes[pid] = (info.get('name') or "", ppid, info.get('create_time'))
+            # Bỏ qua cạnh pid == ppid (PID 0 trên Windows) để tránh vòng lặp
+            if ppid is not None and ppid != pid:
+                self.children.setdefault(ppid, []).append(pid)
+
+        logging.debug(f"Đã chụp bảng process: {len(self.processes)} tiến trình")
+
+    def age(self):
+        """Số giây kể từ lúc chụp"""
+        return time.monotonic() - self.taken_at
+
+    def create_time(self, pid):
+        """Thời điểm tạo của process (None nếu process không có trong ảnh chụp)"""
+        entry = self.processes.get(pid)
+        return entry[2] if entry else None
+
+    def descendants(self, pid):
+        """
+        Liệt kê toàn bộ tiến trình con cháu của một process theo ảnh chụp
+
+        Giống psutil.Process.children(recursive=True): một process chỉ được coi là con
+        nếu được tạo sau process cha (tránh nhầm khi PID cha đã bị tái sử dụng).
+
+        Args:
+            pid: Process ID
+
+        Returns:
+            Danh sách PID con cháu
+        """
+        result = []
+        seen = {pid}
+        stack = [pid]
+        while stack:
+            parent = stack.pop()
+            parent_time = self.create_time(parent)
+            for child in self.children.get(parent, ()):
+                if child in seen:
+                    continue
+                child_time = self.create_time(child)
+                if parent_time is not None and child_time is not None and child_time < parent_time:
+                    continue
+                seen.add(child)
+                result.append(child)
+                stack.append(child)
+        return result
+
+
+class RiskAssessor:
+    """
+    Đánh giá rủi ro có ghi nhớ: dùng chung một ProcessSnapshot cho cả lần kiểm tra
+    và lưu kết quả theo (pid, create_time) để các lần chọn / kill / lưu kết quả
+    không phải tính lại. Kết quả và ảnh chụp hết hạn sau `ttl` giây.
+    """
+
+    def __init__(self, ttl=RISK_CACHE_TTL):
+        self.ttl = ttl
+        self._snapshot = None
+        self._cache = {}  # (pid, create_time) -> (expires_at, (level, desc))
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Chụp lại bảng process (gọi một lần cho mỗi lần kiểm tra) và dọn kết quả đã hết hạn"""
+        snapshot = ProcessSnapshot()
+        now = time.monotonic()
+        with self._lock:
+            self._snapshot = snapshot
+            self._cache = {key: value for key, value in self._cache.items() if value[0] > now}
+        return snapshot
+
+    def snapshot(self):
+        """Trả về ảnh chụp hiện tại, chụp lại nếu chưa có hoặc đã quá TTL"""
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None or snapshot.age() > self.ttl:
+            snapshot = self.refresh()
+        return snapshot
+
+    def assess(self, pid, process_name):
+        """
+        Đánh giá rủi ro của một process, dùng kết quả đã ghi nhớ nếu còn hạn
+
+        Args:
+            pid: Process ID
+            process_name: Tên process
+
+        Returns:
+            Tuple (mức độ rủi ro, mô tả rủi ro) như assess_process_risk
+        """
+        snapshot = self.snapshot()
+        key = (pid, snapshot.create_time(pid))
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        result = assess_process_risk(pid, process_name, snapshot)
+        with self._lock:
+            self._cache[key] = (now + self.ttl, result)
+        return result
+
+    def clear(self):
+        """Xóa toàn bộ ảnh chụp và kết quả đã ghi nhớ"""
+        with self._lock:
+            self._snapshot = None
+            self._cache.clear()
+
+# Hàm kill process
+def kill_process(pid):
+    """
+    Kill một process theo PID
+
+    Args:
+        pid: Process ID
+
+    Returns:
+        Tuple (thành công, thông báo)
+    """
+    logging.info(f"Bắt đầu kill process với PID: {pid}")
+    import psutil
+
+    try:
+        process = psutil.Process(pid)
+        process_name = process.name()
+        logging.debug(f"Tìm thấy process: {process_name} (PID: {pid})")
+
+        # Kill process
+        process.kill()
+        logging.info(f"Đã kill thành công process {process_name} (PID: {pid})")
+
+        return (True, f"✅ Đã kill thành công process {process_name} (PID: {pid})")
+    except psutil.NoSuchProcess:
+        logging.error(f"Process với PID {pid} không tồn tại")
+        return (False, f"❌ Process với PID {pid} không tồn tại")
+    except psutil.AccessDenied:
+        logging.error(f"Không đủ quyền để kill process (PID: {pid})")
+        return (False, f"❌ Không đủ quyền để kill process (PID: {pid}). Hãy chạy với quyền Administrator")
+    except Exception as e:
+        logging.exception(f"Lỗi khi kill process (PID: {pid}): {str(e)}")
+        return (False, f"❌ Lỗi khi kill process (PID: {pid}): {str(e)}")
+
+class KillSummary:
+    """Kết quả dừng nhiều process một lần (xem terminate_processes)"""
+
+    def __init__(self):
+        self.names = {}  # pid -> tên process
+        self.terminated = []  # Thoát sau terminate()
+        self.killed = []  # Phải kill() vì không thoát trong thời gian chờ
+        self.gone = []  # Đã thoát trước khi gửi tín hiệu
+        self.failed = {}  # pid -> thông báo lỗi
+        self.elapsed = 0.0
+
+    @property
+    def stopped(self):
+        """Các PID không còn chạy"""
+        return set(self.terminated) | set(self.killed) | set(self.gone)
+
+    def label(self, pid):
+        return f"{self.names.get(pid, '?')} (PID: {pid})"
+
+    def format(self):
+        """Thông báo tóm tắt một dòng kèm chi tiết các process lỗi"""
+        text = (f"✅ Đã dừng {len(self.terminated) + len(self.killed)} tiến trình "
+                f"({len(self.terminated)} tự thoát, {len(self.killed)} phải kill) trong {self.elapsed:.1f} giây")
+        if self.gone:
+            text += f", {len(self.gone)} đã thoát trước đó"
+        if self.failed:
+            text += f", ❌ {len(self.failed)} lỗi:"
+            text += "".join(f"\n  - {self.label(pid)}: {message}" for pid, message in self.failed.items())
+        return text
+
+# Hàm dừng nhiều process cùng lúc
+def terminate_processes(pids, include_children=False, timeout=KILL_GRACE_TIMEOUT):
+    """
+    Dừng nhiều process song song: terminate() tất cả, chờ tối đa `timeout` giây
+    rồi kill() các process còn lại
+
+    Args:
+        pids: Danh sách PID cần dừng
+        include_children: True để dừng cả cây tiến trình con
+        timeout: Thời gian chờ (giây) sau terminate() trước khi kill()
+
+    Returns:
+        KillSummary
+    """
+    import psutil
+
+    start = time.perf_counter()
+    summary = KillSummary()
+    targets = {}  # pid -> psutil.Process (giữ create_time nên không kill nhầm PID bị tái sử dụng)
+
+    def add_target(process):
+        if process.pid == os.getpid():
+            summary.failed[process.pid] = "Không thể tự dừng ứng dụng"
+            return
+        targets.setdefault(process.pid, process)
+        try:
+            summary.names.setdefault(process.pid, process.name())
+        except psutil.Error:
+            pass
+
+    for pid in pids:
+        try:
+            process = psutil.Process(pid)
+            add_target(process)
+            if include_children:
+                for child in process.children(recursive=True):
+                    add_target(child)
+        except psutil.NoSuchProcess:
+            summary.gone.append(pid)
+        except psutil.AccessDenied:
+            summary.failed[pid] = "Không đủ quyền (hãy chạy với quyền Administrator)"
+
+    # Gửi terminate() cho tất cả trước khi chờ để các process thoát song song
+    logging.info(f"Dừng {len(targets)} tiến trình (chờ tối đa {timeout} giây trước khi kill)")
+    waiting = []
+    for pid, process in targets.items():
+        try:
+            process.terminate()
+            waiting.append(process)
+        except psutil.NoSuchProcess:
+            summary.gone.append(pid)
+        except psutil.AccessDenied:
+            summary.failed[pid] = "Không đủ quyền (hãy chạy với quyền Administrator)"
+        except Exception as e:
+            summary.failed[pid] = str(e)
+
+    gone, alive = psutil.wait_procs(waiting, timeout=timeout)
+    summary.terminated.extend(process.pid for process in gone)
+
+    # Leo thang: kill() các process chưa thoát
+    if alive:
+        logging.warning(f"{len(alive)} tiến trình chưa thoát sau {timeout} giây, chuyển sang kill")
+        waiting = []
+        for process in alive:
+            try:
+                process.kill()
+                waiting.append(process)
+            except psutil.NoSuchProcess:
+                summary.terminated.append(process.pid)
+            except psutil.AccessDenied:
+                summary.failed[process.pid] = "Không đủ quyền để kill"
+            except Exception as e:
+                summary.failed[process.pid] = str(e)
+
+        gone, alive = psutil.wait_procs(waiting, timeout=KILL_WAIT_TIMEOUT)
+        summary.killed.extend(process.pid for process in gone)
+        for process in alive:
+            summary.failed[process.pid] = f"Vẫn chạy sau khi kill ({KILL_WAIT_TIMEOUT} giây)"
+
+    summary.elapsed = time.perf_counter() - start
+    logging.info(summary.format())
+    return summary
+
+# Hàm lấy bộ nhớ RSS đỉnh của tiến trình hiện tại
+def get_peak_rss():
+    """Trả về bộ nhớ RSS đỉnh (byte) của tiến trình hiện tại, None nếu không xác định được"""
+    if sys.platform == "win32":
+        try:
+            # Windows: psutil cung cấp peak working set
+            import psutil
+            peak_wset = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+            if peak_wset is not None:
+                return peak_wset
+        except Exception as e:
+            logging.debug(f"Không lấy được peak working set: {e}")
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+# Số liệu đo đạc hiệu năng của một lần kiểm tra
+class CheckStats:
+    """
+    Thời gian (wall và CPU) của từng giai đoạn kiểm tra cùng các bộ đếm
+
+    Thời gian CPU là của luồng thực hiện giai đoạn đó (không gồm CPU của
+    handle.exe). Với detailed=False chỉ đo các giai đoạn tổng (scan, risk,
+    render) để không làm chậm vòng lặp phân tích từng dòng; với detailed=True
+    đo thêm handle, decode, parse và match cho từng dòng.
+    """
+
+    PHASE_LABELS = {
+        'scan': "Quét (tổng)",
+        'handle': "Chờ output handle.exe",
+        'decode': "Giải mã dòng",
+        'parse': "Phân tích dòng",
+        'match': "So khớp đường dẫn",
+        'risk': "Đánh giá rủi ro",
+        'render': "Hiển thị bảng",
+    }
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.phases = {}  # tên giai đoạn -> [wall, cpu, số lần]
+        self.lines = 0
+        self.bytes = 0
+        self.processes = 0
+        self.handles = 0
+        self.matched_files = 0
+        self.peak_rss = None
+        self.query_info = None
+
+    @staticmethod
+    def mark():
+        """Mốc thời gian (wall, CPU của luồng hiện tại)"""
+        return time.perf_counter(), time.thread_time()
+
+    def lap(self, phase, mark):
+        """Cộng thời gian từ mark đến hiện tại vào giai đoạn phase, trả về mốc mới"""
+        now = self.mark()
+        self.add(phase, now[0] - mark[0], now[1] - mark[1])
+        return now
+
+    def add(self, phase, wall, cpu, count=1):
+        """Cộng thời gian đã đo sẵn (ví dụ từ luồng khác) vào giai đoạn phase"""
+        entry = self.phases.get(phase)
+        if entry is None:
+            entry = self.phases[phase] = [0.0, 0.0, 0]
+        entry[0] += wall
+        entry[1] += cpu
+        entry[2] += count
+
+    @contextmanager
+    def phase(self, phase):
+        """Đo thời gian một khối lệnh vào giai đoạn phase"""
+        mark = self.mark()
+        try:
+            yield
+        finally:
+            self.lap(phase, mark)
+
+    @property
+    def lines_per_second(self):
+        scan = self.phases.get('scan')
+        if not scan or scan[0] <= 0:
+            return 0.0
+        return self.lines / scan[0]
+
+    def update_peak_rss(self):
+        self.peak_rss = get_peak_rss()
+
+    def to_dict(self):
+        """Chuyển số liệu sang dict (dùng cho báo cáo dạng dữ liệu)"""
+        return {
+            'phases': {
+                phase: {'wall': wall, 'cpu': cpu, 'count': count}
+                for phase, (wall, cpu, count) in self.phases.items()
+            },
+            'lines': self.lines,
+            'bytes': self.bytes,
+            'lines_per_second': self.lines_per_second,
+            'processes': self.processes,
+            'handles': self.handles,
+            'matched_files': self.matched_files,
+            'peak_rss': self.peak_rss,
+            'query': self.query_info,
+        }
+
+    def format(self):
+        """Tạo các dòng báo cáo chẩn đoán"""
+        output = ["=== DIAGNOSTICS ==="]
+        for phase, label in self.PHASE_LABELS.items():
+            if phase in self.phases:
+                wall, cpu, count = self.phases[phase]
+                output.append(f"{label:<24} wall {wall * 1000:10.1f} ms   CPU {cpu * 1000:10.1f} ms   ({count} lần)")
+
+        output.append(f"Số dòng: {self.lines}   Số byte: {self.bytes}   Tốc độ: {self.lines_per_second:.0f} dòng/giây")
+        output.append(f"Process: {self.processes}   Handle: {self.handles}   File bị chiếm dụng: {self.matched_files}")
+        if self.peak_rss is not None:
+            output.append(f"Bộ nhớ RSS đỉnh: {self.peak_rss / (1024 * 1024):.1f} MB")
+        if not self.detailed:
+            output.append("(Bật đo chi tiết để xem thời gian từng giai đoạn phân tích)")
+        output.append("=== END DIAGNOSTICS ===")
+        return output
+
+# Hủy một lần kiểm tra đang chạy
+class CheckCancelled(Exception):
+    """Lần kiểm tra bị hủy thông qua CancellationToken"""
+
+class CancellationToken:
+    """
+    Cờ hủy dùng chung giữa luồng giao diện và luồng kiểm tra
+
+    Luồng kiểm tra kiểm tra cờ giữa các dòng output và đăng ký hàm dừng
+    tiến trình con (handle.exe) bằng on_cancel để việc hủy có hiệu lực ngay
+    cả khi đang chờ output.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """Đánh dấu hủy và gọi các hàm đã đăng ký (mỗi hàm chỉ được gọi một lần)"""
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Lỗi khi hủy kiểm tra: {str(e)}")
+
+    def on_cancel(self, callback):
+        """
+        Đăng ký hàm được gọi khi hủy (gọi ngay nếu đã hủy)
+
+        Returns:
+            Hàm để gỡ đăng ký
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CheckCancelled()
+
+    def wait(self, timeout):
+        """Chờ tối đa timeout giây, trả về True nếu bị hủy trong lúc chờ"""
+        return self._event.wait(timeout)
+
+# Hàm chạy handle.exe và đọc output theo từng dòng
+def iter_handle_output(args, timeout=None, stats=None, cancel_token=None):
+    """
+    Chạy handle.exe và trả về từng dòng output ngay khi nhận được,
+    không giữ toàn bộ output trong bộ nhớ
+
+    Args:
+        args: Danh sách tham số dòng lệnh (phần tử đầu là đường dẫn handle.exe)
+        timeout: Thời gian chờ tối đa (giây) trước khi dừng handle.exe, None để dùng HANDLE_TIMEOUT
+        stats: CheckStats để ghi số dòng, số byte và thời gian chờ/giải mã
+        cancel_token: CancellationToken để dừng handle.exe ngay khi người dùng hủy
+
+    Yields:
+        Từng dòng output (đã bỏ ký tự xuống dòng)
+
+    Raises:
+        subprocess.TimeoutExpired: Nếu handle.exe chạy quá thời gian chờ
+        CheckCancelled: Nếu bị hủy qua cancel_token
+    """
+    logging.debug(f"Chạy lệnh: {' '.join(args)}")
+    if timeout is None:
+        timeout = HANDLE_TIMEOUT
+
+    # Đọc dạng byte và tự giải mã từng dòng để đo riêng thời gian chờ và giải mã
+    encoding = locale.getpreferredencoding(False)
+    detailed = stats is not None and stats.detailed
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Đọc stderr ở luồng riêng để handle.exe không bị nghẽn khi pipe đầy
+    stderr_tail = deque(maxlen=20)
+    stderr_thread = threading.Thread(
+        target=lambda: stderr_tail.extend(line.decode(encoding, "replace") for line in process.stderr),
+        daemon=True
+    )
+    stderr_thread.start()
+
+    # Dừng handle.exe nếu chạy quá thời gian chờ
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, on_timeout)
+    timer.daemon = True
+    timer.start()
+
+    # Hủy: dừng handle.exe ngay để readline bên dưới trả về
+    remove_cancel = cancel_token.on_cancel(process.kill) if cancel_token else None
+
+    try:
+        read_line = process.stdout.readline
+        while True:
+            if cancel_token is not None and cancel_token.cancelled:
+                break
+            if detailed:
+                mark = stats.mark()
+            raw_line = read_line()
+            if not raw_line:
+                break
+            if detailed:
+                mark = stats.lap('handle', mark)
+
+            line = raw_line.decode(encoding, "replace").rstrip("\r\n")
+            if stats is not None:
+                stats.lines += 1
+                stats.bytes += len(raw_line)
+                if detailed:
+                    stats.lap('decode', mark)
+            yield line
+
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        process.wait()
+        stderr_thread.join(timeout=1)
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(args, timeout)
+
+        logging.debug(f"Kết quả trả về: exit code={process.returncode}")
+        if process.returncode != 0:
+            logging.error(f"Lỗi khi chạy handle.exe: {''.join(stderr_tail)}")
+    finally:
+        timer.cancel()
+        if remove_cancel:
+            remove_cancel()
+        # Bên gọi dừng đọc giữa chừng hoặc có lỗi: đảm bảo handle.exe không chạy tiếp
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+# Chỉ mục tiền tố đường dẫn cho các thư mục cần kiểm tra
+class PathPrefixIndex:
+    """
+    Chỉ mục dạng cây (trie) theo từng thành phần đường dẫn của các thư mục gốc
+
+    Các thư mục gốc chỉ được chuẩn hóa một lần khi tạo chỉ mục. Mỗi đường dẫn
+    file được so khớp trong O(độ sâu đường dẫn), không phụ thuộc số thư mục gốc,
+    và chỉ khớp trọn thành phần (C:\\site không khớp C:\\site2).
+    """
+
+    # Khóa lưu danh sách thư mục gốc kết thúc tại một nút (thành phần đường dẫn không bao giờ là None)
+    _ROOTS = None
+
+    def __init__(self, folder_paths):
+        self.roots = []
+        self._trie = {}
+        for folder_path in folder_paths:
+            self.add(folder_path)
+
+    @staticmethod
+    def split_path(path):
+        """Chuẩn hóa đường dẫn (không phân biệt hoa thường) và tách thành các thành phần"""
+        norm_path = os.path.normpath(path).lower()
+        return [part for part in re.split(r'[\\/]+', norm_path) if part]
+
+    def add(self, folder_path):
+        """Thêm một thư mục gốc vào chỉ mục"""
+        if folder_path in self.roots:
+            return
+
+        self.roots.append(folder_path)
+        node = self._trie
+        for part in self.split_path(folder_path):
+            node = node.setdefault(part, {})
+        node.setdefault(self._ROOTS, []).append(folder_path)
+
+    def match(self, file_path):
+        """Trả về danh sách các thư mục gốc chứa file_path"""
+        node = self._trie
+        matched = list(node.get(self._ROOTS, ()))
+        for part in self.split_path(file_path):
+            node = node.get(part)
+            if node is None:
+                break
+            matched.extend(node.get(self._ROOTS, ()))
+        return matched
+
+# Hàm lập kế hoạch truy vấn handle.exe
+def plan_handle_query(handle_exe, folder_paths, strategy=QUERY_AUTO):
+    """
+    Chọn cách gọi handle.exe cho các thư mục cần kiểm tra
+
+    handle.exe có thể tự lọc handle theo một đoạn tên (so khớp chuỗi con, không
+    phân biệt hoa thường), nên phần lớn trường hợp chỉ cần truyền đường dẫn thư
+    mục, hoặc phần đường dẫn chung khi kiểm tra nhiều thư mục. Chỉ quét toàn bộ
+    (-a) khi bộ lọc không diễn đạt được truy vấn.
+
+    Args:
+        handle_exe: Đường dẫn handle.exe
+        folder_paths: Danh sách thư mục cần kiểm tra
+        strategy: QUERY_AUTO, QUERY_FILTERED hoặc QUERY_FULL
+
+    Returns:
+        Tuple (chiến lược, danh sách tham số dòng lệnh, lý do chọn)
+    """
+    full_args = [handle_exe, "-a", "/accepteula"]
+
+    if strategy == QUERY_FULL:
+        return QUERY_FULL, full_args, "được yêu cầu quét toàn bộ"
+
+    # Nhiều thư mục: chỉ lọc được theo phần đường dẫn chung
+    try:
+        norm_folder = os.path.commonpath([os.path.normpath(path) for path in folder_paths])
+    except ValueError:
+        return QUERY_FULL, full_args, "các thư mục không có đường dẫn chung"
+    drive, tail = os.path.splitdrive(norm_folder)
+
+    if strategy == QUERY_AUTO:
+        # Thư mục gốc của ổ đĩa: bộ lọc khớp gần như mọi handle, không có lợi
+        if not tail.strip("\\/"):
+            return QUERY_FULL, full_args, "thư mục gốc của ổ đĩa"
+
+        # Đường dẫn mạng được handle.exe hiển thị dưới dạng \Device\Mup\..., không so khớp được
+        if drive.startswith(("\\\\", "//")):
+            return QUERY_FULL, full_args, "đường dẫn mạng (UNC)"
+
+    if len(folder_paths) > 1:
+        reason = f"lọc theo đường dẫn chung của {len(folder_paths)} thư mục"
+    else:
+        reason = "lọc theo đường dẫn thư mục"
+    return QUERY_FILTERED, [handle_exe, "/accepteula", norm_folder, "-nobanner"], reason
+
+# ------------------- Backend liệt kê file đang mở -------------------
+class LockBackend:
+    """
+    Giao diện chung cho các cách liệt kê file đang được process mở
+
+    Mỗi backend cần:
+        check_available(): trả về None nếu dùng được, hoặc thông báo lỗi
+        plan_query(folder_paths, strategy): trả về dict thông tin truy vấn
+            (backend, strategy, reason, args)
+        iter_open_files(query_info, stats, debug_preview, cancel_token, timeout):
+            yield từng bộ (tên process, PID, chi tiết process, đường dẫn file);
+            ném CheckCancelled khi bị hủy và subprocess.TimeoutExpired khi quá
+            timeout giây (None = HANDLE_TIMEOUT)
+    """
+
+    name = None
+
+    def check_available(self):
+        return None
+
+    def plan_query(self, folder_paths, strategy=QUERY_AUTO):
+        raise NotImplementedError
+
+    def iter_open_files(self, query_info, stats, debug_preview, cancel_token=None, timeout=None):
+        raise NotImplementedError
+
+class HandleExeBackend(LockBackend):
+    """Liệt kê handle bằng Sysinternals handle.exe (Windows)"""
+
+    name = "handle"
+
+    # Pattern để trích xuất PID từ output của handle.exe (chế độ -a)
+    PID_PATTERN = re.compile(r'(\S+)\s+pid:\s+(\d+)\s+(.*)')
+    # Pattern dòng handle (chế độ -a): "  40: File  (RW-)   C:\path" hoặc "  44: Section       \name"
+    HANDLE_PATTERN = re.compile(r'\s*[0-9A-Fa-f]+:\s+\S+\s+(?:\([^)]*\)\s+)?(.*)')
+    # Pattern khi lọc theo tên: "w3wp.exe  pid: 1234  type: File  40: C:\path"
+    SEARCH_PATTERN = re.compile(r'(.+?)\s+pid:\s+(\d+)\s+type:\s+(\S+)\s+[0-9A-Fa-f]+:\s+(.*)')
+
+    def __init__(self, handle_exe=None):
+        # None: dùng HANDLE_EXE (hoặc get_handle_path) tại thời điểm chạy (cho phép thay thế HANDLE_EXE)
+        self.handle_exe = handle_exe
+
+    def get_handle_exe(self):
+        return self.handle_exe or HANDLE_EXE or get_handle_path()
+
+    def check_available(self):
+        handle_exe = self.get_handle_exe()
+        logging.debug(f"Sử dụng handle.exe: {handle_exe}")
+        if os.path.exists(handle_exe):
+            return None
+
+        handle_name = os.path.basename(handle_exe)
+        logging.error(f"Không tìm thấy {handle_name}")
+        return (f"❌ Không tìm thấy {handle_name}. Tải từ: https://learn.microsoft.com/en-us/sysinternals/downloads/handle"
+                f" và đặt vào thư mục Handle")
+
+    def plan_query(self, folder_paths, strategy=QUERY_AUTO):
+        query_strategy, query_args, query_reason = plan_handle_query(self.get_handle_exe(), folder_paths, strategy)
+        return {'backend': self.name, 'strategy': query_strategy, 'reason': query_reason, 'args': query_args}
+
+    def iter_open_files(self, query_info, stats, debug_preview, cancel_token=None, timeout=None):
+        detailed = stats.detailed
+        filtered = query_info['strategy'] == QUERY_FILTERED
+
+        # Chạy handle.exe và phân tích output theo từng dòng ngay khi nhận được
+        lines = iter_handle_output(query_info['args'], timeout, stats, cancel_token)
+        logging.debug(f"Sử dụng pattern: {self.PID_PATTERN.pattern}")
+
+        # Lấy thông tin về các process trước
+        current_process = None
+        current_pid = None
+        current_details = None
+
+        for line in lines:
+            if detailed:
+                mark = stats.mark()
+            debug_preview.append(line)
+            file_path = None
+
+            if filtered:
+                # Mỗi dòng chứa cả thông tin process lẫn file
+                search_match = self.SEARCH_PATTERN.match(line)
+                if search_match:
+                    if int(search_match.group(2)) != current_pid:
+                        stats.processes += 1
+                    current_process = search_match.group(1)
+                    current_pid = int(search_match.group(2))
+                    current_details = f"type: {search_match.group(3)}"
+                    file_path = search_match.group(4).strip()
+            else:
+                # Kiểm tra nếu là dòng thông tin process mới
+                pid_match = self.PID_PATTERN.match(line)
+                if pid_match:
+                    stats.processes += 1
+                    current_process = pid_match.group(1)
+                    current_pid = int(pid_match.group(2))
+                    current_details = pid_match.group(3)
+                    logging.debug(f"Tìm thấy process: {current_process} (PID: {current_pid})")
+                elif current_process:
+                    # Kiểm tra nếu là dòng thông tin handle của process hiện tại
+                    handle_match = self.HANDLE_PATTERN.match(line)
+                    if handle_match:
+                        file_path = handle_match.group(1).strip()
+
+            if detailed:
+                stats.lap('parse', mark)
+            if file_path is not None:
+                yield current_process, current_pid, current_details, file_path
+
+class ProcFsBackend(LockBackend):
+    """
+    Liệt kê file đang mở trên Linux bằng /proc/<pid>/fd (file đang mở) và
+    /proc/<pid>/maps (thư viện .so và file được ánh xạ vào bộ nhớ)
+
+    Các PID được đọc song song bằng thread pool; phần lớn thời gian là các
+    lời gọi hệ thống (listdir, readlink, đọc file) nên không bị GIL giới hạn.
+    """
+
+    name = "procfs"
+
+    def __init__(self, proc_root="/proc", max_workers=None):
+        self.proc_root = proc_root
+        self.max_workers = max_workers or PROCFS_WORKERS
+        self._user_names = {}  # uid -> tên người dùng
+
+    def check_available(self):
+        if os.path.isdir(os.path.join(self.proc_root, "self", "fd")):
+            return None
+        return f"❌ Không tìm thấy {self.proc_root}. Backend procfs chỉ dùng được trên Linux"
+
+    def plan_query(self, folder_paths, strategy=QUERY_AUTO):
+        return {
+            'backend': self.name,
+            'strategy': "procfs",
+            'reason': f"đọc {self.proc_root}/<pid>/fd và maps với {self.max_workers} luồng",
+            'args': [self.proc_root],
+        }
+
+    def list_pids(self):
+        return [int(entry) for entry in os.listdir(self.proc_root) if entry.isdigit()]
+
+    def get_user_name(self, uid):
+        if uid not in self._user_names:
+            try:
+                import pwd
+                self._user_names[uid] = pwd.getpwuid(uid).pw_name
+            except (ImportError, KeyError):
+                self._user_names[uid] = str(uid)
+        return self._user_names[uid]
+
+    def read_process(self, pid):
+        """
+        Đọc thông tin và danh sách file đang mở của một process
+
+        Returns:
+            Tuple (tên process, PID, chi tiết, danh sách đường dẫn), hoặc None
+            nếu process đã kết thúc
+        """
+        base = os.path.join(self.proc_root, str(pid))
+        try:
+            with open(os.path.join(base, "comm"), encoding="utf-8", errors="replace") as f:
+                name = f.read().strip()
+            details = self.get_user_name(os.stat(base).st_uid)
+        except OSError:
+            return None
+
+        paths = {}  # dict giữ thứ tự và loại bỏ trùng lặp
+
+        # File đang mở: mỗi fd là symlink tới đường dẫn thật (bỏ qua socket:, pipe:, anon_inode:)
+        fd_dir = os.path.join(base, "fd")
+        try:
+            for fd in os.listdir(fd_dir):
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target.startswith("/"):
+                    paths[target] = None
+        except OSError:
+            # Không đủ quyền đọc fd của process khác
+            details += " (không đủ quyền đọc fd)"
+
+        # File được ánh xạ vào bộ nhớ (thư viện .so): cột thứ 6 của maps
+        try:
+            with open(os.path.join(base, "maps"), encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    parts = line.split(None, 5)
+                    if len(parts) == 6 and parts[5].startswith("/"):
+                        paths[parts[5].rstrip("\n")] = None
+        except OSError:
+            pass
+
+        return name, pid, details, list(paths)
+
+    def iter_open_files(self, query_info, stats, debug_preview, cancel_token=None, timeout=None):
+        from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+        if timeout is None:
+            timeout = HANDLE_TIMEOUT
+        pids = self.list_pids()
+        logging.debug(f"Đọc {len(pids)} process từ {self.proc_root} với {self.max_workers} luồng")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = [executor.submit(self.read_process, pid) for pid in pids]
+            for future in as_completed(futures, timeout=timeout):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                result = future.result()
+                if result is None:
+                    continue
+
+                name, pid, details, paths = result
+                stats.processes += 1
+                for path in paths:
+                    stats.lines += 1
+                    debug_preview.append(f"{name} pid: {pid} {details}: {path}")
+                    yield name, pid, details, path
+        except FuturesTimeoutError:
+            raise subprocess.TimeoutExpired(query_info['args'], timeout)
+        finally:
+            # Hủy/quá thời gian chờ: bỏ các PID chưa đọc thay vì đợi đọc hết
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Các backend có sẵn, theo tên
+LOCK_BACKENDS = {
+    HandleExeBackend.name: HandleExeBackend,
+    ProcFsBackend.name: ProcFsBackend,
+}
+
+def get_lock_backend(name=None):
+    """
+    Tạo backend liệt kê file đang mở
+
+    Args:
+        name: Tên backend trong LOCK_BACKENDS, None để dùng LOCK_BACKEND
+            hoặc tự chọn theo hệ điều hành (Linux: procfs, còn lại: handle)
+    """
+    name = name or LOCK_BACKEND
+    if not name:
+        name = ProcFsBackend.name if sys.platform.startswith("linux") else HandleExeBackend.name
+    return LOCK_BACKENDS[name]()
+
+# ------------------- Ảnh chụp dùng chung -------------------
+class HandleSnapshot:
+    """
+    Ảnh chụp toàn hệ thống các file đang mở (một lần quét đầy đủ)
+
+    Các file được lập chỉ mục theo cây thành phần đường dẫn (như PathPrefixIndex)
+    để lấy mọi file nằm dưới một thư mục bằng cách đi thẳng tới nút của thư mục
+    đó thay vì duyệt toàn bộ ảnh chụp.
+    """
+
+    # Khóa lưu chỉ số các file kết thúc tại một nút (thành phần đường dẫn không bao giờ là None)
+    _ENTRIES = None
+
+    def __init__(self, backend_name, query_info):
+        self.backend_name = backend_name
+        self.query_info = query_info
+        self.taken_at = time.monotonic()
+        self.entries = []  # (tên process, PID, chi tiết, đường dẫn) theo thứ tự của backend
+        self.debug_preview = []
+        self._trie = {}
+
+    def age(self):
+        return time.monotonic() - self.taken_at
+
+    def add(self, name, pid, details, path):
+        index = len(self.entries)
+        self.entries.append((sys.intern(name), pid, sys.intern(details or ""), sys.intern(path)))
+        node = self._trie
+        for part in PathPrefixIndex.split_path(path):
+            node = node.setdefault(part, {})
+        node.setdefault(self._ENTRIES, []).append(index)
+
+    def iter_under(self, folder_paths):
+        """Lần lượt các file nằm trong (các) thư mục, theo thứ tự của backend"""
+        indexes = []
+        visited = set()
+        for folder_path in folder_paths:
+            node = self._trie
+            for part in PathPrefixIndex.split_path(folder_path):
+                node = node.get(part)
+                if node is None:
+                    break
+            if node is None:
+                continue
+
+            # Duyệt cây con của thư mục (bỏ qua nút đã duyệt khi các thư mục lồng nhau)
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                if id(current) in visited:
+                    continue
+                visited.add(id(current))
+                for key, child in current.items():
+                    if key is self._ENTRIES:
+                        indexes.extend(child)
+                    else:
+                        stack.append(child)
+
+        indexes.sort()
+        entries = self.entries
+        for index in indexes:
+            yield entries[index]
+
+class _SnapshotFlight:
+    """Một lần chụp đang chạy, các luồng khác chờ và dùng chung kết quả"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot = None
+        self.error = None
+
+class SnapshotCache:
+    """
+    Bộ nhớ đệm ảnh chụp toàn hệ thống dùng chung giữa các lần kiểm tra
+
+    Mọi lần kiểm tra trong vòng `ttl` giây dùng lại cùng một ảnh chụp. Khi ảnh
+    chụp hết hạn, chỉ một luồng chạy backend (handle.exe) để chụp lại, các luồng
+    yêu cầu cùng lúc chờ và dùng chung kết quả (single-flight).
+    """
+
+    def __init__(self, ttl=SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._flight = None
+
+    def invalidate(self):
+        """Bỏ ảnh chụp hiện tại, lần kiểm tra sau sẽ chụp lại"""
+        with self._lock:
+            self._snapshot = None
+
+    def peek(self):
+        """Ảnh chụp gần nhất (có thể đã hết hạn), None nếu chưa chụp"""
+        with self._lock:
+            return self._snapshot
+
+    def get(self, backend, stats=None, cancel_token=None, timeout=None, force=False):
+        """
+        Lấy ảnh chụp còn hạn hoặc chụp mới
+
+        Args:
+            backend: LockBackend dùng để chụp
+            stats: CheckStats của lần chụp (chỉ được cập nhật khi chụp mới)
+            cancel_token, timeout: Như scan_locked_files
+            force: True để bỏ qua ảnh chụp còn hạn và chụp lại
+
+        Returns:
+            Tuple (HandleSnapshot, True nếu dùng lại ảnh chụp có sẵn)
+        """
+        while True:
+            with self._lock:
+                snapshot = self._snapshot
+                if (snapshot is not None and not force and snapshot.backend_name == backend.name
+                        and snapshot.age() < self.ttl):
+                    return snapshot, True
+                flight = self._flight
+                leader = flight is None
+                if leader:
+                    flight = self._flight = _SnapshotFlight()
+
+            if leader:
+                try:
+                    flight.snapshot = self.take(backend, stats, cancel_token, timeout)
+                    with self._lock:
+                        self._snapshot = flight.snapshot
+                    return flight.snapshot, False
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._flight = None
+                    flight.done.set()
+
+            # Đã có luồng khác đang chụp: chờ và dùng chung kết quả
+            logging.debug("Chờ lần chụp đang chạy ở luồng khác")
+            while not flight.done.wait(0.1):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+            if flight.snapshot is not None and flight.snapshot.backend_name == backend.name:
+                return flight.snapshot, True
+            if not isinstance(flight.error, CheckCancelled):
+                raise flight.error
+            # Luồng chụp bị hủy (bởi người dùng của luồng đó): tự chụp lại
+
+    def take(self, backend, stats=None, cancel_token=None, timeout=None):
+        """Chụp toàn bộ file đang mở bằng backend (luôn dùng truy vấn đầy đủ)"""
+        if stats is None:
+            stats = CheckStats()
+        query_info = backend.plan_query([], QUERY_FULL)
+        query_info['reason'] = "ảnh chụp toàn hệ thống dùng chung"
+        snapshot = HandleSnapshot(backend.name, query_info)
+        logging.info(f"Chụp toàn bộ file đang mở bằng [{backend.name}]")
+
+        debug_preview = deque(maxlen=DEBUG_PREVIEW_LINES)
+        start = time.perf_counter()
+        for name, pid, details, path in backend.iter_open_files(query_info, stats, debug_preview,
+                                                                 cancel_token, timeout):
+            snapshot.add(name, pid, details, path)
+        query_info['elapsed'] = time.perf_counter() - start
+        snapshot.debug_preview = list(debug_preview)
+        logging.info(f"Đã chụp {len(snapshot.entries)} file đang mở trong {query_info['elapsed']:.2f} giây")
+        return snapshot
+
+# Bộ nhớ đệm dùng chung cho giao diện
+SNAPSHOT_CACHE = SnapshotCache()
+
+# ------------------- Mô hình kết quả -------------------
+class LockRecord:
+    """Một process đang chiếm dụng file trong kết quả kiểm tra"""
+
+    __slots__ = ('name', 'pid', 'details', 'files', 'root_files', 'item_id', 'risk')
+
+    def __init__(self, name, pid, details):
+        self.name = name
+        self.pid = pid
+        self.details = details
+        self.files = []  # Đường dẫn file bị chiếm dụng (đã intern), theo thứ tự tìm thấy
+        self.root_files = None  # Chỉ khi kiểm tra nhiều thư mục: thư mục gốc -> array chỉ số trong files
+        self.item_id = None  # Dòng tương ứng trên bảng tiến trình (nếu đang hiển thị)
+        self.risk = None  # (mức độ rủi ro, mô tả ngắn) sau khi đánh giá
+
+    @property
+    def key(self):
+        """Tên hiển thị dạng "tên (PID: pid)" """
+        return f"{self.name} (PID: {self.pid})"
+
+    @property
+    def roots(self):
+        """Các thư mục gốc có file bị process chiếm dụng (rỗng khi chỉ kiểm tra một thư mục)"""
+        return list(self.root_files) if self.root_files else []
+
+    def files_in(self, root):
+        """Các file bị chiếm dụng nằm trong thư mục gốc root"""
+        if self.root_files is None:
+            return self.files
+        return [self.files[i] for i in self.root_files.get(root, ())]
+
+class LockResult:
+    """
+    Kết quả một lần kiểm tra: kho duy nhất các LockRecord
+
+    Tra cứu theo PID (by_pid, cũng là kho chính và giữ thứ tự tìm thấy) và theo
+    item_id của dòng trên bảng (by_item) đều O(1). Tên process, chi tiết và đường
+    dẫn được intern nên các chuỗi lặp lại (ví dụ cùng một DLL) chỉ lưu một lần.
+    """
+
+    __slots__ = ('roots', 'by_pid', 'by_item', 'query_info', 'stats', 'debug', 'error')
+
+    def __init__(self, roots=(), query_info=None, stats=None):
+        self.roots = list(roots)
+        self.by_pid = {}  # pid -> LockRecord
+        self.by_item = {}  # item_id trên bảng -> LockRecord
+        self.query_info = query_info
+        self.stats = stats
+        self.debug = []  # Các dòng debug (output cuối của backend)
+        self.error = None  # Thông báo khi kiểm tra không hoàn thành (lỗi, hủy, quá thời gian chờ)
+
+    def __iter__(self):
+        return iter(self.by_pid.values())
+
+    @property
+    def process_count(self):
+        return len(self.by_pid)
+
+    @property
+    def file_count(self):
+        return sum(len(record.files) for record in self.by_pid.values())
+
+    def add(self, name, pid, details, file_path, roots):
+        """
+        Thêm một file bị chiếm dụng
+
+        Args:
+            name: Tên process
+            pid: Process ID
+            details: Chi tiết process
+            file_path: Đường dẫn file
+            roots: Các thư mục gốc chứa file
+
+        Returns:
+            LockRecord của process
+        """
+        record = self.by_pid.get(pid)
+        if record is None:
+            record = self.by_pid[pid] = LockRecord(sys.intern(name), pid, sys.intern(details or ""))
+
+        index = len(record.files)
+        record.files.append(sys.intern(file_path))
+        if len(self.roots) > 1:
+            if record.root_files is None:
+                record.root_files = {}
+            for root in roots:
+                indexes = record.root_files.get(root)
+                if indexes is None:
+                    indexes = record.root_files[root] = array('L')
+                indexes.append(index)
+        return record
+
+    def get(self, pid):
+        return self.by_pid.get(pid)
+
+    def find_item(self, item_id):
+        return self.by_item.get(item_id)
+
+    def bind_item(self, record, item_id):
+        """Gắn record với dòng item_id trên bảng"""
+        record.item_id = item_id
+        self.by_item[item_id] = record
+
+    def unbind_items(self):
+        """Bỏ liên kết với các dòng trên bảng (chỉ duyệt các dòng đã tạo)"""
+        for record in self.by_item.values():
+            record.item_id = None
+        self.by_item.clear()
+
+    def remove(self, pid):
+        """Xóa process khỏi kết quả (ví dụ sau khi kill)"""
+        record = self.by_pid.pop(pid, None)
+        if record is not None and record.item_id is not None:
+            self.by_item.pop(record.item_id, None)
+            record.item_id = None
+        return record
+
+    def records_in(self, root):
+        """Các process có file bị chiếm dụng trong thư mục gốc root"""
+        if len(self.roots) <= 1:
+            return list(self.by_pid.values())
+        return [record for record in self.by_pid.values() if record.root_files and root in record.root_files]
+
+def scan_locked_files(folder_paths, on_lock=None, strategy=QUERY_AUTO, stats=None, backend=None,
+                      cancel_token=None, timeout=None, partial=False, cache=None, refresh=False):
+    """
+    Liệt kê file đang mở một lần và gom các file bị chiếm dụng theo từng thư mục gốc
+
+    Args:
+        folder_paths: Danh sách thư mục cần kiểm tra
+        on_lock: Hàm được gọi ngay khi tìm thấy một file bị chiếm dụng,
+            nhận (LockRecord, đường dẫn file)
+        strategy: Chiến lược truy vấn handle.exe (xem plan_handle_query)
+        stats: CheckStats để ghi thời gian từng giai đoạn và các bộ đếm
+        backend: LockBackend dùng để liệt kê file, None để tự chọn
+        cancel_token: CancellationToken để hủy giữa chừng
+        timeout: Thời gian chờ tối đa (giây), None để dùng HANDLE_TIMEOUT
+        partial: True để trả về các kết quả đã phân tích được khi bị hủy hoặc
+            quá thời gian chờ (query_info['incomplete'] = "cancelled"/"timeout")
+            thay vì ném lỗi
+        cache: SnapshotCache để dùng chung ảnh chụp toàn hệ thống (bỏ qua strategy)
+        refresh: True để chụp lại dù ảnh chụp trong cache còn hạn
+
+    Returns:
+        LockResult (kèm query_info, stats và các dòng debug)
+
+    Raises:
+        subprocess.TimeoutExpired: Nếu handle.exe chạy quá thời gian chờ (khi partial=False)
+        CheckCancelled: Nếu bị hủy (khi partial=False)
+    """
+    if stats is None:
+        stats = CheckStats()
+    if backend is None:
+        backend = get_lock_backend()
+    detailed = stats.detailed
+
+    # Chuẩn hóa các thư mục gốc một lần duy nhất
+    prefix_index = PathPrefixIndex(folder_paths)
+
+    # Bộ đệm vòng chỉ giữ DEBUG_PREVIEW_LINES dòng cuối để debug
+    debug_preview = deque(maxlen=DEBUG_PREVIEW_LINES)
+    lines_before = stats.lines
+    query_start = time.perf_counter()
+    scan_mark = stats.mark()
+
+    if cache is not None:
+        # Dùng ảnh chụp toàn hệ thống (chụp mới nếu hết hạn), chỉ duyệt các file trong thư mục cần kiểm tra
+        snapshot, cache_hit = cache.get(backend, stats, cancel_token, timeout, force=refresh)
+        query_info = dict(snapshot.query_info, cache="hit" if cache_hit else "miss", age=snapshot.age())
+        debug_preview.extend(snapshot.debug_preview)
+        open_files = snapshot.iter_under(prefix_index.roots)
+    else:
+        # Lập kế hoạch truy vấn: lọc theo thư mục nếu được, nếu không thì quét toàn bộ
+        query_info = backend.plan_query(prefix_index.roots, strategy)
+        open_files = backend.iter_open_files(query_info, stats, debug_preview, cancel_token, timeout)
+    result = LockResult(prefix_index.roots, query_info, stats)
+    logging.info(f"Chiến lược truy vấn: [{backend.name}] {query_info['strategy']} ({query_info['reason']})")
+
+    logging.debug("Bắt đầu phân tích output")
+    file_count = 0
+    matched_file_count = 0
+
+    try:
+        for process_name, pid, details, file_path in open_files:
+            if detailed:
+                mark = stats.mark()
+            file_count += 1
+
+            # Tìm các thư mục gốc chứa file (bao gồm cả thư mục con)
+            try:
+                matched_roots = prefix_index.match(file_path)
+            except Exception as e:
+                logging.error(f"Lỗi khi xử lý đường dẫn: {e}")
+                matched_roots = None
+
+            if detailed:
+                stats.lap('match', mark)
+            if not matched_roots:
+                continue
+
+            matched_file_count += 1
+            logging.debug(f"Tìm thấy file bị chiếm dụng: {file_path} bởi {process_name}")
+
+            record = result.add(process_name, pid, details, file_path, matched_roots)
+
+            # Gửi ngay file vừa tìm thấy cho bên gọi
+            if on_lock:
+                on_lock(record, file_path)
+    except (CheckCancelled, subprocess.TimeoutExpired) as e:
+        if not partial:
+            raise
+        query_info['incomplete'] = "cancelled" if isinstance(e, CheckCancelled) else "timeout"
+        logging.warning(f"Kiểm tra dừng giữa chừng ({query_info['incomplete']}), trả về kết quả một phần")
+    finally:
+        open_files.close()
+
+    stats.lap('scan', scan_mark)
+    stats.handles += file_count
+    stats.matched_files += matched_file_count
+    stats.update_peak_rss()
+
+    query_info['elapsed'] = time.perf_counter() - query_start
+    stats.query_info = query_info
+    logging.info(f"Truy vấn {query_info['strategy']} hoàn thành trong {query_info['elapsed']:.2f} giây")
+
+    line_count = stats.lines - lines_before
+    logging.debug(f"Số dòng output: {line_count}")
+    logging.debug(f"Kết quả phân tích: {stats.processes} processes, {file_count} files, {matched_file_count} files bị chiếm dụng")
+    logging.debug(f"Hiệu năng: {stats.lines_per_second:.0f} dòng/giây, {stats.bytes} byte")
+
+    # Thêm debug info vào kết quả
+    result.debug.append(f"=== DEBUG: Output {backend.name} ===")
+    if line_count > len(debug_preview):
+        result.debug.append(f"... bỏ qua {line_count - len(debug_preview)} dòng trước đó")
+    result.debug.extend(debug_preview)
+    result.debug.append("=== END DEBUG ===\n")
+
+    return result
+
+def check_locked_files(folder_path, callback=None, on_lock=None, strategy=QUERY_AUTO, stats=None, backend=None,
+                       cancel_token=None, timeout=None, partial=False, progress=None, cache=None, refresh=False):
+    """
+    Kiểm tra các file bị khóa trong thư mục
+
+    Args:
+        folder_path: Đường dẫn thư mục cần kiểm tra
+        callback: Hàm nhận LockResult khi kiểm tra xong (cho chạy bất đồng bộ)
+        on_lock: Hàm được gọi ngay khi tìm thấy một file bị chiếm dụng,
+            nhận (LockRecord, đường dẫn file)
+        strategy: Chiến lược truy vấn handle.exe (xem plan_handle_query)
+        stats: CheckStats để nhận số liệu đo đạc từng giai đoạn
+        backend: LockBackend dùng để liệt kê file, None để tự chọn theo hệ điều hành
+        cancel_token: CancellationToken để hủy giữa chừng (dừng cả handle.exe)
+        timeout: Thời gian chờ tối đa (giây), None để dùng HANDLE_TIMEOUT
+        partial: True để trả về kết quả một phần khi bị hủy hoặc quá thời gian chờ
+        progress: Hàm nhận thông báo "đang kiểm tra"
+        cache: SnapshotCache để dùng chung ảnh chụp giữa các lần kiểm tra liên tiếp
+        refresh: True để chụp lại dù ảnh chụp trong cache còn hạn
+
+    Returns:
+        LockResult; nếu kiểm tra không hoàn thành thì result.error chứa thông báo.
+        Dùng format_result để tạo báo cáo dạng văn bản.
+    """
+    return check_locked_folders([folder_path], callback, on_lock, strategy, stats, backend,
+                                cancel_token, timeout, partial, progress, cache, refresh)
+
+def check_locked_folders(folder_paths, callback=None, on_lock=None, strategy=QUERY_AUTO, stats=None, backend=None,
+                         cancel_token=None, timeout=None, partial=False, progress=None, cache=None, refresh=False):
+    """
+    Kiểm tra các file bị khóa trong nhiều thư mục với một lần chạy handle.exe
+
+    Args:
+        folder_paths: Danh sách thư mục cần kiểm tra
+        Các tham số còn lại giống check_locked_files
+
+    Returns:
+        LockResult (nhóm được theo thư mục bằng LockResult.records_in)
+    """
+    logging.debug(f"Bắt đầu kiểm tra file bị khóa trong {len(folder_paths)} thư mục")
+    if stats is None:
+        stats = CheckStats()
+
+    # Kiểm tra backend (handle.exe, /proc...) dùng được
+    if backend is None:
+        backend = get_lock_backend()
+    error = backend.check_available()
+
+    if not error:
+        try:
+            if progress:
+                if len(folder_paths) == 1:
+                    progress("⏳ Đang kiểm tra, vui lòng đợi...")
+                else:
+                    progress(f"⏳ Đang kiểm tra {len(folder_paths)} thư mục, vui lòng đợi...")
+
+            result = scan_locked_files(folder_paths, on_lock, strategy, stats, backend,
+                                       cancel_token, timeout, partial, cache, refresh)
+            logging.info(f"Tìm thấy {result.process_count} tiến trình đang chiếm dụng file")
+        except CheckCancelled:
+            logging.info("Đã hủy kiểm tra")
+            error = "🛑 Đã hủy thao tác kiểm tra."
+        except subprocess.TimeoutExpired as e:
+            logging.error(f"Quá thời gian chờ ({e.timeout} giây) khi liệt kê file đang mở")
+            error = (f"⚠️ Quá thời gian chờ ({e.timeout} giây) khi chạy handle.exe. "
+                     f"Thư mục có thể quá lớn hoặc có vấn đề truy cập.")
+        except Exception as e:
+            logging.exception(f"Lỗi không xác định khi kiểm tra file bị khóa: {str(e)}")
+            error = f"❌ Lỗi: {str(e)}"
+
+    if error:
+        result = LockResult(folder_paths, stats=stats)
+        result.error = error
+
+    if callback:
+        callback(result)
+    return result
+
+def format_query_info(query_info):
+    """Tạo dòng mô tả chiến lược truy vấn cho báo cáo"""
+    text = (f"🧭 Chiến lược truy vấn: [{query_info['backend']}] {query_info['strategy']} ({query_info['reason']}) - "
+            f"{query_info['elapsed']:.2f} giây")
+    if query_info.get('cache') == "hit":
+        text += f" (dùng lại ảnh chụp {query_info['age']:.1f} giây trước)"
+    if query_info.get('incomplete'):
+        text += f"\n{INCOMPLETE_LABELS.get(query_info['incomplete'], query_info['incomplete'])}"
+    return text
+
+def iter_locked_files(records, root=None, indent=""):
+    """Sinh lần lượt các dòng báo cáo cho danh sách LockRecord"""
+    for record in records:
+        files = record.files if root is None else record.files_in(root)
+        yield f"\n{indent}📌 Process: {record.key}"
+        for file in files:
+            yield f"{indent}  - {file}"
+
+def iter_report_lines(result):
+    """
+    Sinh lần lượt các dòng báo cáo dạng văn bản cho một LockResult
+
+    Báo cáo chỉ được tạo khi có người đọc (lưu file, xuất báo cáo), không
+    giữ cả báo cáo trong bộ nhớ.
+    """
+    if result.error:
+        yield result.error
+        return
+
+    query_text = format_query_info(result.query_info)
+    if len(result.roots) == 1:
+        if result.process_count:
+            yield f"🔒 Các file đang bị chiếm dụng ({result.process_count} tiến trình):"
+            yield query_text
+            yield from iter_locked_files(result)
+        else:
+            yield f"✅ Không có file nào bị chiếm dụng trong thư mục này.\n\nThư mục kiểm tra: {result.roots[0]}"
+            yield query_text
+    else:
+        # Nhiều thư mục: nhóm theo thư mục gốc
+        grouped = [(root, result.records_in(root)) for root in result.roots]
+        locked_folder_count = sum(1 for _, records in grouped if records)
+        yield (f"🔒 Kết quả kiểm tra {len(result.roots)} thư mục "
+               f"({locked_folder_count} thư mục có file bị chiếm dụng):")
+        yield query_text
+        for root, records in grouped:
+            if records:
+                yield f"\n📁 {root}: {len(records)} tiến trình"
+                yield from iter_locked_files(records, root, indent="  ")
+            else:
+                yield f"\n📁 {root}: ✅ Không có file nào bị chiếm dụng"
+
+    # Thông tin chẩn đoán và debug
+    if result.stats is not None:
+        yield "\n\n" + "\n".join(result.stats.format())
+    yield "\n" + "\n".join(result.debug)
+
+def format_result(result):
+    """
+    Tạo báo cáo dạng văn bản cho một LockResult
+
+    Args:
+        result: LockResult trả về từ check_locked_files / check_locked_folders
+
+    Returns:
+        Chuỗi báo cáo (kèm số liệu chẩn đoán và debug)
+    """
+    return "\n".join(iter_report_lines(result))
+
+# ------------------- Xuất kết quả -------------------
+# Các hàm export_* ghi thẳng từng dòng/bản ghi ra file nên bộ nhớ dùng thêm
+# không phụ thuộc số file bị chiếm dụng. Tham số risk (tùy chọn) là hàm nhận
+# LockRecord và trả về (mức độ rủi ro, mô tả) như assess_process_risk.
+
+RISK_LEVEL_NAMES = ("low", "medium", "high")
+
+def _record_risk(record, risk):
+    if risk is None:
+        return None, ""
+    try:
+        return risk(record)
+    except Exception as e:
+        logging.error(f"Lỗi khi đánh giá rủi ro cho {record.key}: {str(e)}")
+        return None, ""
+
+def export_text(result, fp, risk=None):
+    """Xuất báo cáo văn bản (danh sách tiến trình, rủi ro và file)"""
+    if result.error or not result.process_count:
+        for line in iter_report_lines(result):
+            fp.write(line + "\n")
+        return
+
+    fp.write("DANH SÁCH TIẾN TRÌNH ĐANG CHIẾM DỤNG FILE\n")
+    fp.write("=" * 50 + "\n")
+    if result.query_info:
+        fp.write(format_query_info(result.query_info) + "\n")
+    fp.write("\n")
+
+    for record in result:
+        fp.write(f"Tiến trình: {record.name}\n")
+        fp.write(f"PID: {record.pid}\n")
+        fp.write(f"Số file bị chiếm dụng: {len(record.files)}\n")
+        fp.write(f"Chi tiết: {record.details}\n")
+        if record.roots:
+            fp.write(f"Thư mục: {', '.join(record.roots)}\n")
+        _, risk_desc = _record_risk(record, risk)
+        if risk_desc:
+            fp.write(f"Đánh giá rủi ro: {risk_desc}\n")
+        fp.write("\nDanh sách file bị chiếm dụng:\n")
+        for i, file in enumerate(record.files, 1):
+            fp.write(f"  {i}. {file}\n")
+        fp.write("\n" + "-" * 50 + "\n\n")
+
+    if result.stats is not None:
+        fp.write("\n".join(result.stats.format()) + "\n")
+
+def export_json(result, fp, risk=None):
+    """Xuất một tài liệu JSON: thông tin truy vấn và danh sách process kèm file"""
+    dumps = json.dumps
+    query_info = {key: value for key, value in (result.query_info or {}).items() if key != 'args'}
+    fp.write('{"roots": ' + dumps(result.roots, ensure_ascii=False))
+    fp.write(', "query": ' + dumps(query_info, ensure_ascii=False))
+    fp.write(', "error": ' + dumps(result.error, ensure_ascii=False))
+    fp.write(', "processes": [')
+    for index, record in enumerate(result):
+        risk_level, risk_desc = _record_risk(record, risk)
+        fp.write(",\n" if index else "\n")
+        fp.write('{"name": ' + dumps(record.name, ensure_ascii=False))
+        fp.write(', "pid": ' + dumps(record.pid))
+        fp.write(', "details": ' + dumps(record.details, ensure_ascii=False))
+        fp.write(', "roots": ' + dumps(record.roots, ensure_ascii=False))
+        fp.write(', "risk": ' + dumps(RISK_LEVEL_NAMES[risk_level] if risk_level is not None else None))
+        fp.write(', "risk_description": ' + dumps(risk_desc or None, ensure_ascii=False))
+        fp.write(', "files": [')
+        for file_index, file in enumerate(record.files):
+            if file_index:
+                fp.write(", ")
+            fp.write(dumps(file, ensure_ascii=False))
+        fp.write("]}")
+    fp.write("\n]}\n")
+
+def export_ndjson(result, fp, risk=None):
+    """Xuất NDJSON: mỗi dòng là một file bị chiếm dụng kèm process chiếm dụng"""
+    dumps = json.dumps
+    for record in result:
+        risk_level, _ = _record_risk(record, risk)
+        prefix = ('{"process": ' + dumps(record.name, ensure_ascii=False) +
+                  ', "pid": ' + dumps(record.pid) +
+                  ', "risk": ' + dumps(RISK_LEVEL_NAMES[risk_level] if risk_level is not None else None) +
+                  ', "file": ')
+        for file in record.files:
+            fp.write(prefix + dumps(file, ensure_ascii=False) + "}\n")
+
+def export_csv(result, fp, risk=None):
+    """Xuất CSV: mỗi dòng là một file bị chiếm dụng kèm process chiếm dụng"""
+    writer = csv.writer(fp)
+    writer.writerow(["process", "pid", "details", "risk", "file"])
+    for record in result:
+        risk_level, _ = _record_risk(record, risk)
+        risk_name = RISK_LEVEL_NAMES[risk_level] if risk_level is not None else ""
+        for file in record.files:
+            writer.writerow([record.name, record.pid, record.details, risk_name, file])
+
+# Định dạng xuất theo tên và phần mở rộng file
+EXPORT_FORMATS = {
+    "text": export_text,
+    "json": export_json,
+    "ndjson": export_ndjson,
+    "csv": export_csv,
+}
+EXPORT_EXTENSIONS = {".txt": "text", ".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+def save_result(result, file_path, fmt=None, risk=None):
+    """
+    Ghi kết quả ra file theo từng dòng
+
+    Args:
+        result: LockResult
+        file_path: Đường dẫn file đích
+        fmt: "text", "json", "ndjson" hoặc "csv"; None để chọn theo phần mở rộng
+        risk: Hàm đánh giá rủi ro cho từng LockRecord (tùy chọn)
+
+    Returns:
+        Định dạng đã dùng
+    """
+    if fmt is None:
+        fmt = EXPORT_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), "text")
+    exporter = EXPORT_FORMATS[fmt]
+    # newline="" để module csv tự quản lý ký tự xuống dòng
+    with open(file_path, 'w', encoding='utf-8', newline="" if fmt == "csv" else None) as fp:
+        exporter(result, fp, risk)
+    logging.info(f"Đã xuất kết quả ({fmt}) ra {file_path}")
+    return fmt
+
+# ------------------- Theo dõi liên tục -------------------
+class LockDiff:
+    """
+    Khác biệt giữa hai LockResult liên tiếp
+
+    added/changed chứa LockRecord của kết quả mới, removed chứa LockRecord của
+    kết quả cũ; acquired/released là các cặp (LockRecord, đường dẫn file).
+    """
+
+    __slots__ = ('added', 'removed', 'changed', 'acquired', 'released')
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.acquired = []
+        self.released = []
+
+    @property
+    def empty(self):
+        return not (self.added or self.removed or self.changed)
+
+def diff_results(old, new):
+    """
+    So sánh hai LockResult theo process (PID + tên) và theo từng file
+
+    Args:
+        old: LockResult trước đó (None nếu là lần quét đầu tiên)
+        new: LockResult mới
+
+    Returns:
+        LockDiff
+    """
+    diff = LockDiff()
+    old_records = old.by_pid if old is not None else {}
+
+    for pid, record in new.by_pid.items():
+        old_record = old_records.get(pid)
+        if old_record is None or old_record.name != record.name:
+            diff.added.append(record)
+            diff.acquired.extend((record, path) for path in record.files)
+            continue
+        if old_record.files == record.files:
+            continue
+        old_files = set(old_record.files)
+        new_files = set(record.files)
+        diff.acquired.extend((record, path) for path in record.files if path not in old_files)
+        diff.released.extend((old_record, path) for path in old_record.files if path not in new_files)
+        diff.changed.append(record)
+
+    for pid, old_record in old_records.items():
+        record = new.by_pid.get(pid)
+        if record is None or record.name != old_record.name:
+            diff.removed.append(old_record)
+            diff.released.extend((old_record, path) for path in old_record.files)
+    return diff
+
+class LockWatcher:
+    """
+    Quét lại các thư mục theo chu kỳ trên một luồng nền và báo về các thay đổi
+
+    Chu kỳ bắt đầu từ min_interval, nhân với backoff sau mỗi lần quét không
+    có thay đổi (tối đa max_interval) và trở về min_interval ngay khi có thay
+    đổi. Mỗi file bị khóa / được mở khóa được ghi vào dòng thời gian kèm thời
+    điểm phát hiện.
+    """
+
+    def __init__(self, folder_paths, on_update, strategy=QUERY_AUTO, backend=None, timeout=None,
+                 min_interval=WATCH_MIN_INTERVAL, max_interval=WATCH_MAX_INTERVAL, backoff=WATCH_BACKOFF):
+        """
+        Args:
+            folder_paths: Danh sách thư mục cần theo dõi
+            on_update: Hàm được gọi (từ luồng nền) sau mỗi lần quét, nhận
+                (LockResult, LockDiff hoặc None nếu quét lỗi, danh sách sự kiện mới)
+            strategy, backend, timeout: Như check_locked_folders
+        """
+        self.folder_paths = list(folder_paths)
+        self.on_update = on_update
+        self.strategy = strategy
+        self.backend = backend
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.cancel_token = CancellationToken()
+        self.previous = None  # LockResult của lần quét gần nhất
+        self.active = {}  # (pid, đường dẫn) -> thời điểm phát hiện file bị khóa
+        self.timeline = deque(maxlen=WATCH_TIMELINE_SIZE)  # Các sự kiện gần nhất
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Dừng theo dõi (dừng cả handle.exe nếu đang quét)"""
+        self.cancel_token.cancel()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive() and not self.cancel_token.cancelled
+
+    def record_events(self, diff, now=None):
+        """
+        Chuyển LockDiff thành các sự kiện của dòng thời gian
+
+        Returns:
+            Danh sách (thời điểm, "acquired"/"released", tên process, PID, đường dẫn,
+            thời gian giữ khóa tính bằng giây hoặc None)
+        """
+        now = now or time.time()
+        events = []
+        for record, path in diff.released:
+            acquired_at = self.active.pop((record.pid, path), None)
+            events.append((now, "released", record.name, record.pid, path,
+                           now - acquired_at if acquired_at is not None else None))
+        for record, path in diff.acquired:
+            self.active.setdefault((record.pid, path), now)
+            events.append((now, "acquired", record.name, record.pid, path, None))
+        self.timeline.extend(events)
+        return events
+
+    def run(self):
+        logging.info(f"Bắt đầu theo dõi {len(self.folder_paths)} thư mục")
+        while not self.cancel_token.cancelled:
+            result = check_locked_folders(self.folder_paths, strategy=self.strategy, stats=CheckStats(),
+                                          backend=self.backend, cancel_token=self.cancel_token,
+                                          timeout=self.timeout)
+            if self.cancel_token.cancelled:
+                break
+
+            if result.error:
+                # Giữ kết quả trước để lần quét sau so sánh đúng
+                diff, events = None, []
+            else:
+                diff = diff_results(self.previous, result)
+                events = self.record_events(diff)
+                self.previous = result
+                if diff.empty:
+                    self.interval = min(self.interval * self.backoff, self.max_interval)
+                else:
+                    self.interval = self.min_interval
+                logging.debug(f"Theo dõi: +{len(diff.added)} -{len(diff.removed)} ~{len(diff.changed)}, "
+                              f"quét lại sau {self.interval:.1f} giây")
+
+            try:
+                self.on_update(result, diff, events)
+            except Exception as e:
+                logging.exception(f"Lỗi khi xử lý kết quả theo dõi: {str(e)}")
+
+            if self.cancel_token.wait(self.interval):
+                break
+        logging.info("Đã dừng theo dõi")
+
+def format_timeline_event(event):
+    """Tạo dòng hiển thị cho một sự kiện của dòng thời gian"""
+    timestamp, kind, name, pid, path, held = event
+    clock = datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')
+    if kind == "acquired":
+        return f"[{clock}] 🔒 {name} (PID: {pid}) khóa {path}"
+    held_text = f" sau {held:.1f} giây" if held is not None else ""
+    return f"[{clock}] 🔓 {name} (PID: {pid}) nhả {path}{held_text}"
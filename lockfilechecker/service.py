@@ -0,0 +1,288 @@
+"""
+Dịch vụ truy vấn file bị khóa chạy nền trên máy cục bộ (HTTP trên localhost)
+
+Dịch vụ giữ sẵn một ảnh chụp file đang mở (HandleSnapshot) và bảng process
+(RiskAssessor), làm mới theo chu kỳ trên luồng nền. Mỗi truy vấn chỉ duyệt
+phần ảnh chụp nằm dưới thư mục/file được hỏi nên trả lời trong vài mili giây,
+nhiều agent deploy trên cùng máy dùng chung một lần chạy handle.exe.
+
+Endpoint:
+    GET  /check?path=D:\\app&path=D:\\lib[&risk=1][&refresh=1]
+         Kết quả dạng export_json (PATH có thể là thư mục hoặc file)
+    GET  /status   Tuổi ảnh chụp, số file đang mở, số truy vấn đã phục vụ
+    POST /refresh  Chụp lại ngay
+
+Chạy dịch vụ:
+    python -m lockfilechecker serve [--port 8765] [--interval 5]
+
+Truy vấn từ script hoặc giao diện (LockServiceClient):
+    python -m lockfilechecker check D:\\app --server http://127.0.0.1:8765
+"""
+import io
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+from lockfilechecker.core import (
+    HANDLE_TIMEOUT,
+    RISK_LEVEL_NAMES,
+    CheckStats,
+    LockResult,
+    PathPrefixIndex,
+    RiskAssessor,
+    SnapshotCache,
+    check_locked_folders,
+    export_json,
+    get_lock_backend,
+)
+
+SERVICE_HOST = "127.0.0.1"  # Chỉ nhận kết nối từ máy cục bộ
+SERVICE_PORT = 8765
+SERVICE_URL = f"http://{SERVICE_HOST}:{SERVICE_PORT}"
+SERVICE_REFRESH_INTERVAL = 5  # Chu kỳ (giây) làm mới ảnh chụp trên luồng nền
+
+class LockService:
+    """
+    Trạng thái của dịch vụ: ảnh chụp dùng chung, bảng process và bộ đếm truy vấn
+
+    Ảnh chụp còn hạn thêm một chu kỳ sau mỗi lần làm mới, nên các truy vấn đến
+    giữa hai lần làm mới không phải chờ quét; nếu luồng làm mới bị trễ, truy vấn
+    đầu tiên sau khi hết hạn chụp lại (các truy vấn đồng thời chờ chung lần chụp đó).
+    """
+
+    def __init__(self, backend=None, interval=SERVICE_REFRESH_INTERVAL, timeout=None):
+        self.backend = backend if backend is not None else get_lock_backend()
+        self.interval = interval
+        self.timeout = timeout
+        self.cache = SnapshotCache(ttl=interval * 2)
+        self.risk_assessor = RiskAssessor(ttl=interval * 2)
+        self.started_at = time.time()
+        self.requests = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Chụp lần đầu rồi làm mới theo chu kỳ trên luồng nền"""
+        self.refresh()
+        self._thread = threading.Thread(target=self.run_refresher, name="lock-service-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_refresher(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def refresh(self):
+        """Chụp lại file đang mở và bảng process"""
+        error = self.backend.check_available()
+        if not error:
+            try:
+                self.cache.get(self.backend, timeout=self.timeout, force=True)
+            except Exception as e:
+                logging.exception(f"Lỗi khi làm mới ảnh chụp: {str(e)}")
+                error = f"❌ Lỗi: {str(e)}"
+        self.last_error = error
+
+        try:
+            self.risk_assessor.refresh()
+        except Exception as e:
+            logging.error(f"Lỗi khi chụp bảng process: {str(e)}")
+
+    def check(self, folder_paths, refresh=False):
+        """Kiểm tra các thư mục/file bằng ảnh chụp dùng chung, trả về LockResult"""
+        with self._lock:
+            self.requests += 1
+        return check_locked_folders(folder_paths, backend=self.backend, timeout=self.timeout,
+                                    cache=self.cache, refresh=refresh)
+
+    def assess(self, record):
+        return self.risk_assessor.assess(record.pid, record.name)
+
+    def status(self):
+        snapshot = self.cache.peek()
+        return {
+            'backend': self.backend.name,
+            'uptime': time.time() - self.started_at,
+            'requests': self.requests,
+            'interval': self.interval,
+            'snapshot_age': snapshot.age() if snapshot else None,
+            'open_files': len(snapshot.entries) if snapshot else 0,
+            'error': self.last_error,
+        }
+
+class LockServiceHandler(BaseHTTPRequestHandler):
+    """Xử lý một yêu cầu HTTP (mỗi kết nối một luồng, xem ThreadingHTTPServer)"""
+
+    server_version = "LockFileChecker"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/check":
+            paths = query.get("path")
+            if not paths:
+                self.send_json(400, {'error': "Thiếu tham số path"})
+                return
+            result = self.service.check(paths, refresh=query.get("refresh", ["0"])[0] == "1")
+            risk = self.service.assess if query.get("risk", ["0"])[0] == "1" else None
+            body = io.StringIO()
+            export_json(result, body, risk)
+            self.send_body(503 if result.error else 200, body.getvalue())
+        elif url.path == "/status":
+            self.send_json(200, self.service.status())
+        else:
+            self.send_json(404, {'error': f"Không có endpoint {url.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path == "/refresh":
+            self.service.refresh()
+            self.send_json(200, self.service.status())
+        else:
+            self.send_json(404, {'error': f"Không có endpoint {self.path}"})
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data, ensure_ascii=False))
+
+    def send_body(self, status, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+class LockServiceServer(ThreadingHTTPServer):
+    """HTTP server mỗi kết nối một luồng, hàng đợi kết nối đủ lớn cho nhiều agent gọi cùng lúc"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service):
+        super().__init__(address, LockServiceHandler)
+        self.service = service
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, backend=None, interval=SERVICE_REFRESH_INTERVAL, timeout=None):
+    """
+    Chạy dịch vụ cho tới khi bị dừng (Ctrl+C)
+
+    Args:
+        host, port: Địa chỉ lắng nghe (mặc định chỉ localhost)
+        backend: LockBackend, None để tự chọn
+        interval: Chu kỳ (giây) làm mới ảnh chụp
+        timeout: Thời gian chờ tối đa (giây) cho một lần chụp, None để dùng HANDLE_TIMEOUT
+    """
+    service = LockService(backend, interval, timeout)
+    server = LockServiceServer((host, port), service)
+    if host not in (SERVICE_HOST, "localhost", "::1"):
+        logging.warning(f"Dịch vụ lắng nghe trên {host}: máy khác trong mạng cũng truy vấn được")
+
+    logging.info(f"Chụp lần đầu bằng [{service.backend.name}]")
+    service.start()
+    logging.info(f"Dịch vụ đang chạy tại http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Dừng dịch vụ")
+    finally:
+        service.stop()
+        server.server_close()
+
+def result_from_json(data, stats=None):
+    """Dựng lại LockResult từ tài liệu JSON của export_json"""
+    prefix_index = PathPrefixIndex(data.get('roots') or [])
+    result = LockResult(prefix_index.roots, data.get('query'), stats if stats is not None else CheckStats())
+    result.error = data.get('error')
+    for process in data.get('processes', ()):
+        record = None
+        for path in process['files']:
+            record = result.add(process['name'], process['pid'], process['details'], path, prefix_index.match(path))
+        if record is not None and process.get('risk'):
+            record.risk = (RISK_LEVEL_NAMES.index(process['risk']), process.get('risk_description') or "")
+    return result
+
+class LockServiceClient:
+    """
+    Truy vấn dịch vụ từ script hoặc giao diện (thin client)
+
+    check_locked_folders trả về LockResult giống lockfilechecker.core.check_locked_folders,
+    lỗi kết nối được báo qua result.error.
+    """
+
+    def __init__(self, url=SERVICE_URL, timeout=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, params=None, timeout=None):
+        url = self.url + path
+        if params:
+            url += "?" + urlencode(params, doseq=True)
+        try:
+            with urlopen(Request(url, method=method), timeout=timeout or self.timeout or HANDLE_TIMEOUT) as response:
+                return json.load(response)
+        except HTTPError as e:
+            # Dịch vụ vẫn trả JSON (kèm "error") khi kiểm tra không thành công
+            with e:
+                return json.load(e)
+
+    def status(self):
+        return self.request("GET", "/status")
+
+    def refresh(self):
+        return self.request("POST", "/refresh")
+
+    def check_locked_folders(self, folder_paths, callback=None, timeout=None, refresh=False, risk=False,
+                             progress=None, cancel_token=None):
+        """
+        Kiểm tra các thư mục/file qua dịch vụ
+
+        Args:
+            folder_paths: Danh sách thư mục (hoặc file) cần kiểm tra
+            callback: Hàm nhận LockResult khi hoàn thành
+            timeout: Thời gian chờ phản hồi (giây)
+            refresh: True để dịch vụ chụp lại thay vì dùng ảnh chụp còn hạn
+            risk: True để kèm đánh giá rủi ro của dịch vụ (LockRecord.risk)
+            progress: Hàm nhận thông báo "đang kiểm tra"
+            cancel_token: CancellationToken; kết quả về sau khi đã hủy bị bỏ qua
+
+        Returns:
+            LockResult
+        """
+        if progress:
+            progress(f"⏳ Đang truy vấn dịch vụ {self.url}, vui lòng đợi...")
+
+        params = {'path': list(folder_paths)}
+        if refresh:
+            params['refresh'] = 1
+        if risk:
+            params['risk'] = 1
+        try:
+            result = result_from_json(self.request("GET", "/check", params, timeout))
+        except (URLError, OSError, ValueError) as e:
+            logging.error(f"Không truy vấn được dịch vụ {self.url}: {e}")
+            result = LockResult(folder_paths, stats=CheckStats())
+            result.error = f"❌ Không kết nối được dịch vụ {self.url}: {e}"
+
+        if cancel_token is not None and cancel_token.cancelled:
+            result = LockResult(folder_paths, stats=CheckStats())
+            result.error = "🛑 Đã hủy thao tác kiểm tra."
+
+        if callback:
+            callback(result)
+        return result